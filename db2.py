@@ -14,6 +14,19 @@ import sys
 import re
 import warnings
 import string
+import time
+import threading
+import concurrent.futures
+import asyncio
+import contextvars
+import weakref
+import hashlib
+import tempfile
+import decimal
+import itertools
+import functools
+import queue
+from collections import OrderedDict, deque
 
 _settings = {
      "format"   : "pandas",
@@ -26,7 +39,30 @@ _settings = {
      "uid"      : "DB2INST1",
      "pwd"      : "password",
      "ssl"      : "",
-     "pandas"   : False
+     "pandas"   : False,
+     "numpy"    : False,
+     "blocksize": 10000,
+     "cachesize": 64,
+     "bind"     : False,
+     "poolsize" : 4,
+     "parallel" : 1,
+     "concurrency" : 4,
+     "timing"   : False,
+     "cache"    : False,
+     "ttl"      : 300,
+     "cachebytes" : 256 * 1024 * 1024,
+     "arrow"    : False,
+     "disk"     : False,
+     "refresh"  : False,
+     "diskdir"  : os.path.join(os.path.expanduser("~"), ".db2cache"),
+     "diskbytes": 2 * 1024 * 1024 * 1024,
+     "diskttl"  : 24 * 60 * 60,
+     "metattl"  : 600,
+     "describe" : False,
+     "decimal"  : False,
+     "native"   : False,
+     "compact"  : False,
+     "prefetch" : False
 }
 
 # Determine if we can use Pandas dataframes for result sets
@@ -39,6 +75,23 @@ except:
     _settings['format'] = 'array'
     _settings['pandas'] = False
 
+# Determine if we can use NumPy arrays for columnar result sets
+
+try:
+    import numpy
+    _settings['numpy'] = True
+except:
+    _settings['numpy'] = False
+
+# Determine if we can use Arrow files for the disk cache
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    _settings['arrow'] = True
+except:
+    _settings['arrow'] = False
+
 # Check to see if Db2 libraries exist
 
 try:
@@ -70,9 +123,10 @@ def split_string(in_port,splitter=":"):
 
 def parseConnect(inSQL,local_ns):
     
-    global _settings, _connected
+    global _settings, _connected, _hdbc, _hdbi, _dsn
 
     _connected = False
+    alias = None
 
     _, allSQL = sqlParser(inSQL,local_ns)
     
@@ -120,20 +174,28 @@ def parseConnect(inSQL,local_ns):
             else:
                 errormsg("No port specified in the CONNECT statement")
                 return
+        elif cParms[cnt].upper() == 'AS':
+            if cnt+1 < len(cParms):
+                alias = cParms[cnt+1].lower()
+                cnt = cnt + 1
+            else:
+                errormsg("No connection name specified in the CONNECT statement")
+                return
         elif cParms[cnt].upper() in ('CLOSE','RESET') :
-            try:
-                result = ibm_db.close(_hdbc)
-                _hdbi.close()
-            except:
-                pass
+            closeConnection(_hdbc, _hdbi)
+            _hdbc = None
+            _hdbi = None
+            _dsn = None
                      
             if cParms[cnt].upper() == 'RESET': 
                 _settings["database"] = ''
+                closePool()
             return
         else:
             cnt = cnt + 1
                      
-    _ = db2_doConnect()            
+    if (db2_doConnect() == True and alias != None):
+        _connections[alias] = _dsn                  # Name the connection so sql(conn=...) can use it
     
 #-----------------------------------------------------------
 # Connect to Db2 
@@ -141,7 +203,7 @@ def parseConnect(inSQL,local_ns):
 
 def db2_doConnect():
     
-    global _hdbc, _hdbi, _connected
+    global _hdbc, _hdbi, _connected, _dsn
     global _settings  
 
     if _connected == False: 
@@ -163,30 +225,129 @@ def db2_doConnect():
                                  _settings["pwd"],
                                  _settings["ssl"])
 
+    # The connection we are leaving goes back to the pool so switching back doesn't need a new handshake
+
+    if (_hdbc != None and _dsn != None):
+        checkinConnection(_dsn, _hdbc, _hdbi)
+        _hdbc = None
+        _hdbi = None
+        _dsn = None
+
     # Get a database handle (hdbc) and a statement handle (hstmt) for subsequent access to DB2
 
     try:
-        _hdbc  = ibm_db.connect(dsn, "", "")
+        _hdbc, _hdbi = checkoutConnection(dsn)
     except Exception as err:
-        db2_error() # errormsg(str(err))
         _connected = False
-        _settings["database"] = ''
-        return False
-    
-    try:
-        _hdbi = ibm_db_dbi.Connection(_hdbc)
-    except Exception as err:
         db2_error() # errormsg(str(err))
-        _connected = False
         _settings["database"] = ''
-        return False  
+        return False
     
+    _dsn = dsn
     _connected = True
+    _connections[_settings["database"].lower()] = dsn
     
     errormsg("Connection successful.",0,"00000")
 
     return True
     
+#-----------------------------------------------------------
+# Connection Pool
+#-----------------------------------------------------------
+
+def checkoutConnection(dsn):
+    
+    # Hand out an idle connection for this DSN if a live one exists, otherwise connect
+    
+    global _pool, _poolLock
+    
+    while True:
+        with _poolLock:
+            idle = _pool.setdefault(dsn, [])
+            if (len(idle) == 0): break
+            hdbc, hdbi = idle.pop()
+        if (validConnection(hdbc) == True):
+            return hdbc, hdbi
+        closeConnection(hdbc, hdbi)
+        
+    hdbc = ibm_db.connect(dsn, "", "")
+    hdbi = ibm_db_dbi.Connection(hdbc)
+    return hdbc, hdbi
+
+def checkinConnection(dsn, hdbc, hdbi):
+    
+    global _pool, _poolLock, _settings
+    
+    with _poolLock:
+        idle = _pool.setdefault(dsn, [])
+        if (len(idle) < _settings["poolsize"]):
+            idle.append((hdbc, hdbi))
+            return
+        
+    closeConnection(hdbc, hdbi)                     # Pool is full
+
+def validConnection(hdbc):
+    
+    try:
+        return (ibm_db.active(hdbc) == True)
+    except:
+        return False
+
+def closeConnection(hdbc, hdbi):
+    
+    try:
+        result = ibm_db.close(hdbc)
+        hdbi.close()
+    except:
+        pass
+    clearStmtCache(hdbc)                            # Handles prepared on this connection are gone
+
+def closePool():
+    
+    global _pool, _poolLock, _connections
+    
+    with _poolLock:
+        idle = [conn for conns in _pool.values() for conn in conns]
+        _pool.clear()
+        _connections.clear()
+        
+    for hdbc, hdbi in idle:
+        closeConnection(hdbc, hdbi)
+
+#-----------------------------------------------------------
+# Run against a named connection
+#-----------------------------------------------------------
+
+def useConnection(name, sqlstmts, local_ns):
+    
+    # Borrow a pooled handle for the named connection, run the statements on it and give it 
+    # back. The current connection is left as it was.
+    
+    global _hdbc, _hdbi, _connected, _dsn, _connections
+    
+    dsn = _connections.get(str(name).lower())
+    if (dsn == None):
+        errormsg("Connection " + str(name) + " has not been defined with a CONNECT statement.")
+        return None
+    
+    try:
+        hdbc, hdbi = checkoutConnection(dsn)
+    except Exception as err:
+        errormsg("Unable to connect to " + str(name) + ": " + str(err))
+        return None
+    
+    saved = (_hdbc, _hdbi, _connected, _dsn)
+    _hdbc, _hdbi, _connected, _dsn = hdbc, hdbi, True, dsn
+    
+    local_ns = dict(local_ns)
+    del local_ns["conn"]
+    
+    try:
+        return sql(sqlstmts, **local_ns)
+    finally:
+        _hdbc, _hdbi, _connected, _dsn = saved
+        checkinConnection(dsn, hdbc, hdbi)
+
 #------------------------------
 # Error Message Handling
 #------------------------------
@@ -201,35 +362,11 @@ def db2_error():
     
     try:
         if (_connected == True):
-            errmsg = ibm_db.stmt_errormsg().replace('\r',' ')
-            errmsg = errmsg[errmsg.rfind("]")+1:].strip()
+            errmsg = ibm_db.stmt_errormsg()
         else:
-            errmsg = ibm_db.conn_errormsg().replace('\r',' ')
-            errmsg = errmsg[errmsg.rfind("]")+1:].strip()
+            errmsg = ibm_db.conn_errormsg()
             
-        _sqlerror = errmsg
- 
-        msg_start = errmsg.find("SQLSTATE=")
-        if (msg_start != -1):
-            msg_end = errmsg.find(" ",msg_start)
-            if (msg_end == -1):
-                msg_end = len(errmsg)
-            _sqlstate = errmsg[msg_start+9:msg_end]
-        else:
-            _sqlstate = "0"
-    
-        msg_start = errmsg.find("SQLCODE=")
-        if (msg_start != -1):
-            msg_end = errmsg.find(" ",msg_start)
-            if (msg_end == -1):
-                msg_end = len(errmsg)
-            _sqlcode = errmsg[msg_start+8:msg_end]
-            try:
-                _sqlcode = int(_sqlcode)
-            except:
-                pass
-        else:        
-            _sqlcode = 0
+        _sqlerror, _sqlcode, _sqlstate = parseErrmsg(errmsg)
             
     except:
         errmsg = "Unknown error."
@@ -237,30 +374,41 @@ def db2_error():
         _sqlstate = "-99999"
         _sqlerror = errmsg
         return
-        
+
+#------------------------------
+# Split up an error message
+#------------------------------
+
+def parseErrmsg(errmsg):
+    
+    # Return the message text, SQLCODE and SQLSTATE found in a driver error message
+    
+    errmsg = errmsg.replace('\r',' ')
+    errmsg = errmsg[errmsg.rfind("]")+1:].strip()
     
     msg_start = errmsg.find("SQLSTATE=")
     if (msg_start != -1):
         msg_end = errmsg.find(" ",msg_start)
         if (msg_end == -1):
             msg_end = len(errmsg)
-        _sqlstate = errmsg[msg_start+9:msg_end]
+        sqlstate = errmsg[msg_start+9:msg_end]
     else:
-        _sqlstate = "0"
-        
+        sqlstate = "0"
     
     msg_start = errmsg.find("SQLCODE=")
     if (msg_start != -1):
         msg_end = errmsg.find(" ",msg_start)
         if (msg_end == -1):
             msg_end = len(errmsg)
-        _sqlcode = errmsg[msg_start+8:msg_end]
+        sqlcode = errmsg[msg_start+8:msg_end]
         try:
-            _sqlcode = int(_sqlcode)
+            sqlcode = int(sqlcode)
         except:
             pass
-    else:
-        _sqlcode = 0
+    else:        
+        sqlcode = 0
+        
+    return errmsg, sqlcode, sqlstate
     
 #------------------------------
 # Error message
@@ -282,23 +430,29 @@ def sqlcode(request=None):
  
     global _sqlstate, _sqlerror, _sqlcode
     
+    sqlerror, sqlcode, sqlstate = _sqlerror, _sqlcode, _sqlstate
+    
+    asyncError = _asyncError.get()                   # Set by the last asql() call in this task
+    if (asyncError != None):
+        sqlerror, sqlcode, sqlstate = asyncError
+    
     if (request == None):
-        return _sqlcode
+        return sqlcode
     elif (request == "message"):
-        return _sqlerror
+        return sqlerror
     elif (request == "sqlstate"):
-        return _sqlstate
+        return sqlstate
     elif (request == "sqlcode"):
-        return _sqlcode
+        return sqlcode
     else:
-        return _sqlcode
+        return sqlcode
         
 
 #------------------------------
 # SQL Parser 
 #------------------------------
 
-def sqlParser(sqlin,local_ns):
+def sqlParser(sqlin,local_ns,parms=None):
 
     global _settings
        
@@ -323,102 +477,145 @@ def sqlParser(sqlin,local_ns):
     if (':' not in sqlin): # A quick check to see if parameters are in here, but not fool-proof!         
         return sql_cmd, encoded_sql    
     
-    inVar = False 
-    inQuote = "" 
-    varName = ""
-    encoded_sql = ""
+    flag_quotes = _settings["quotes"]
+    
+    encoded = []
+    for kind, value in tokenizeSQL(sqlin, _settings["delim"]):
+        if (kind == "var"):                                 # Quotes and comments come through untouched
+            encoded.append(varText(value[1:],flag_quotes,local_ns,parms))
+        else:
+            encoded.append(value)
+            
+    encoded_sql = "".join(encoded)
+
+    return sql_cmd, encoded_sql
+
+#------------------------------
+# Text for a variable
+#------------------------------
+
+def varText(varName,flag_quotes,local_ns,parms=None):
     
     STRING = 0
     NUMBER = 1
     LIST = 2
     RAW = 3
-
-    flag_quotes = _settings["quotes"]
     
-    for ch in sqlin:
-        if (inVar == True): # We are collecting the name of a variable
-            if (ch.upper() in "@_ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"):
-                varName = varName + ch
-                continue
+    if (varName == ""):
+        return ":"
+    
+    if (parms != None):                                     # Bind mode sends the value as a parameter
+        markers = bindMarkers(varName,local_ns,parms)
+        if (markers != None): return markers
+        
+    varValue, varType = getContents(varName,flag_quotes,local_ns)
+    if (varValue == None):                 
+        return ":" + varName
+    
+    if (varType == STRING):
+        return varValue
+    elif (varType == NUMBER):
+        return str(varValue)
+    elif (varType == RAW):
+        return varValue
+    elif (varType == LIST):
+        values = []
+        for v in varValue:
+            if (isinstance(v,int) == True):         # Integer value 
+                values.append(str(v))
+            elif (isinstance(v,float) == True):
+                values.append(str(v))
             else:
-                if (varName == ""):
-                    encoded_sql = encoded_sql + ":"
-                else:
-                    varValue, varType = getContents(varName,flag_quotes,local_ns)
-                    if (varValue == None):                 
-                        encoded_sql = encoded_sql + ":" + varName
+                try:
+                    if (v.find('0x') == 0):               # Just guessing this is a hex value at beginning
+                        values.append(v)
                     else:
-                        if (varType == STRING):
-                            encoded_sql = encoded_sql + varValue
-                        elif (varType == NUMBER):
-                            encoded_sql = encoded_sql + str(varValue)
-                        elif (varType == RAW):
-                            encoded_sql = encoded_sql + varValue
-                        elif (varType == LIST):
-                            start = True
-                            for v in varValue:
-                                if (start == False):
-                                    encoded_sql = encoded_sql + ","
-                                if (isinstance(v,int) == True):         # Integer value 
-                                    encoded_sql = encoded_sql + str(v)
-                                elif (isinstance(v,float) == True):
-                                    encoded_sql = encoded_sql + str(v)
-                                else:
-                                    flag_quotes = True
-                                    try:
-                                        if (v.find('0x') == 0):               # Just guessing this is a hex value at beginning
-                                            encoded_sql = encoded_sql + v
-                                        else:
-                                            encoded_sql = encoded_sql + addquotes(v,flag_quotes)      # String
-                                    except:
-                                        encoded_sql = encoded_sql + addquotes(str(v),flag_quotes)                                   
-                                start = False
-
-                encoded_sql = encoded_sql + ch
-                varName = ""
-                inVar = False  
-        elif (inQuote != ""):
-            encoded_sql = encoded_sql + ch
-            if (ch == inQuote): inQuote = ""
-        elif (ch in ("'",'"')):
-            encoded_sql = encoded_sql + ch
-            inQuote = ch
-        elif (ch == ":"): # This might be a variable
-            varName = ""
-            inVar = True
-        else:
-            encoded_sql = encoded_sql + ch
+                        values.append(addquotes(v,True))      # String
+                except:
+                    values.append(addquotes(str(v),True))                                   
+        return ",".join(values)
     
-    if (inVar == True):
-        varValue, varType = getContents(varName,flag_quotes,local_ns) # We assume the end of a line is quoted
-        if (varValue == None):                 
-            encoded_sql = encoded_sql + ":" + varName  
-        else:
-            if (varType == STRING):
-                encoded_sql = encoded_sql + varValue
-            elif (varType == NUMBER):
-                encoded_sql = encoded_sql + str(varValue)
-            elif (varType == LIST):
-                flag_quotes = True
-                start = True
-                for v in varValue:
-                    if (start == False):
-                        encoded_sql = encoded_sql + ","
-                    if (isinstance(v,int) == True):         # Integer value 
-                        encoded_sql = encoded_sql + str(v)
-                    elif (isinstance(v,float) == True):
-                        encoded_sql = encoded_sql + str(v)
-                    else:
-                        try:
-                            if (v.find('0x') == 0):               # Just guessing this is a hex value
-                                encoded_sql = encoded_sql + v
-                            else:
-                                encoded_sql = encoded_sql + addquotes(v,flag_quotes)              # String
-                        except:
-                            encoded_sql = encoded_sql + addquotes(str(v),flag_quotes)                                 
-                    start = False
+    return ""
 
-    return sql_cmd, encoded_sql
+#------------------------------
+# SQL Tokenizer
+#------------------------------
+
+@functools.lru_cache(maxsize=16)
+def sqlScanner(delimiter):
+    
+    # One compiled pattern that splits text into quoted strings, comments, :variables, 
+    # delimiters and plain text in a single left to right pass
+    
+    return re.compile(r"""(?P<quote>'[^']*'?|"[^"]*"?)"""
+                      r"""|(?P<comment>--[^\n]*)"""
+                      r"""|(?P<var>:[@_A-Za-z0-9]*)"""
+                      r"""|(?P<delim>""" + re.escape(delimiter) + r""")"""
+                      r"""|(?P<text>[^'":\-""" + re.escape(delimiter[:1]) + r"""]+|.)""", re.S)
+
+@functools.lru_cache(maxsize=256)
+def tokenizeSQL(text, delimiter=";"):
+    
+    # (kind, value) pairs for the text. Results are remembered so running the same cell again 
+    # (or a loop over the same statement) doesn't scan it a second time.
+    
+    scanner = sqlScanner(delimiter)
+    return tuple([(found.lastgroup, found.group()) for found in scanner.finditer(text)])
+
+def stripComments(text):
+    
+    return "".join([value for kind, value in tokenizeSQL(text) if kind != "comment"])
+
+#------------------------------
+# Parameter markers for a variable
+#------------------------------
+
+def bindMarkers(varName,local_ns,parms):
+    
+    #
+    # Return the ? markers that replace :varName and add the values to parms. None means the 
+    # value can't be bound (hex literals, unquoted text, empty lists) and is spliced in instead.
+    #
+    
+    global _settings
+    
+    value = getLocal(varName, local_ns)
+    
+    if (value == None or _settings["quotes"] == False):
+        return None
+    
+    if (isinstance(value,dict) == True):          # JSON dictionary is sent as its text
+        parms.append(json.dumps(value))
+        return "?"
+    
+    if (isinstance(value,list) == True):          # Each entry in the list gets its own marker
+        if (len(value) == 0): return None
+        for v in value:
+            if (isinstance(v,str) == True and v.find('0x') == 0): return None
+        parms.extend(value)
+        return ",".join(["?"] * len(value))
+    
+    if (isinstance(value,(int,float)) == True):
+        parms.append(value)
+        return "?"
+    
+    if (isinstance(value,str) == True):
+        if (value.find('0x') == 0): return None   # Hex values stay in the SQL text
+        parms.append(value)
+        return "?"
+    
+    return None
+
+#------------------------------
+# Execute with bound parameters
+#------------------------------
+
+def executeStmt(stmt, parms=None):
+    
+    if (parms):
+        return ibm_db.execute(stmt, tuple(parms))
+    else:
+        return ibm_db.execute(stmt)
 
 #------------------------------
 #  Find a local variable
@@ -506,7 +703,13 @@ def addquotes(inString,flag_quotes):
 
 def findProc(procname):
     
-    global _hdbc, _hdbi, _connected
+    global _hdbc, _hdbi, _connected, _procCache
+    
+    # The catalog answer is kept for metattl seconds so a CALL in a loop is one round trip
+    cacheKey = (_dsn, procname.upper())
+    cached = _procCache.get(cacheKey)
+    if (cached != None and time.time() < cached[1]):
+        return cached[0]
     
     # Split the procedure name into schema.procname if appropriate
     upper_procname = procname.upper()
@@ -526,6 +729,7 @@ def findProc(procname):
         result = ibm_db.fetch_tuple(stmt)
         resultsets = result[5]
         if (resultsets >= 1): resultsets = 1
+        _procCache[cacheKey] = (resultsets, time.time() + _settings["metattl"])
         return resultsets
             
     except Exception as err:
@@ -538,57 +742,34 @@ def findProc(procname):
 
 def parseCallArgs(macro):
     
-    quoteChar = ""
-    inQuote = False
-    inParm = False
-    ignore = False
-    name = ""
-    parms = []
-    parm = ''
+    # The procedure name (blanks removed) and the text of each argument. Quotes ("", '' or []) 
+    # are removed from the arguments and an empty argument between commas becomes null.
     
     sqlin = macro.replace("\n","")
-    sqlin.lstrip()
-    
-    for ch in sqlin:
-        if (inParm == False):
-            # We hit a blank in the name, so ignore everything after the procedure name until a ( is found
-            if (ch == " "): 
-                ignore == True
-            elif (ch ==  "("): # Now we have parameters to send to the stored procedure
-                inParm = True
+    
+    paren = sqlin.find("(")
+    if (paren == -1):
+        return(sqlin.replace(" ",""),[])
+    
+    name = sqlin[:paren].replace(" ","")
+    parms = []
+    parm = ""
+    
+    for found in _callTokens.finditer(sqlin, paren+1):
+        kind = found.lastgroup
+        if (kind == "close"):
+            break
+        elif (kind == "comma"):
+            if (parm != ""):
+                parms.append(parm)                  
             else:
-                if (ignore == False): name = name + ch # The name of the procedure (and no blanks)
+                parms.append("null")
+            parm = ""
         else:
-            if (inQuote == True):
-                if (ch == quoteChar):
-                    inQuote = False  
-                else:
-                    parm = parm + ch
-            elif (ch in ("\"","\'","[")): # Do we have a quote
-                if (ch == "["):
-                    quoteChar = "]"
-                else:
-                    quoteChar = ch
-                inQuote = True
-            elif (ch == ")"):
-                if (parm != ""):
-                    parms.append(parm)
-                parm = ""
-                break
-            elif (ch == ","):
-                if (parm != ""):
-                    parms.append(parm)                  
-                else:
-                    parms.append("null")
-                    
-                parm = ""
-
-            else:
-                parm = parm + ch
+            parm = parm + found.group(kind)             # Text, or the inside of a quote
                 
-    if (inParm == True):
-        if (parm != ""):
-            parms.append(parm)    
+    if (parm != ""):
+        parms.append(parm)    
             
     return(name,parms)
 
@@ -596,7 +777,17 @@ def parseCallArgs(macro):
 # Get columns 
 #------------------------------
 
-def getColumns(stmt):
+def getColumns(stmt, report=True):
+    
+    # report=False is for worker threads, which raise the driver error instead of setting the 
+    # global error fields
+    
+    global _columnCache
+    
+    # Statements from the statement cache have their descriptions kept alongside them
+    cached = _columnCache.get(id(stmt))
+    if (cached != None and time.time() < cached[2]):
+        return list(cached[0]), list(cached[1])
     
     columns = []
     types = []
@@ -610,9 +801,14 @@ def getColumns(stmt):
             colcount += 1
             colname = ibm_db.field_name(stmt,colcount)
             coltype = ibm_db.field_type(stmt,colcount)            
+            
+        if (id(stmt) in _columnCache):
+            _columnCache[id(stmt)] = (tuple(columns), tuple(types), time.time() + _settings["metattl"])
+            
         return columns,types   
                 
     except Exception as err:
+        if (report == False): raise
         db2_error()
         return None
 
@@ -674,26 +870,13 @@ def parseCall(hdbc, inSQL, local_ns):
             columns, types = getColumns(stmt)
             if (columns == None): return None
             
+            converters = converterPlan(types)
+            
             rows = []
-            rowlist = ibm_db.fetch_tuple(stmt)
-            while ( rowlist ) :
-                row = []
-                colcount = 0
-                for col in rowlist:
-                    try:
-                        if (types[colcount] in ["int","bigint"]):
-                            row.append(int(col))
-                        elif (types[colcount] in ["decimal","real"]):
-                            row.append(float(col))
-                        elif (types[colcount] in ["date","time","timestamp"]):
-                            row.append(str(col))
-                        else:
-                            row.append(col)
-                    except:
-                        row.append(col)
-                    colcount += 1
-                rows.append(row)
-                rowlist = ibm_db.fetch_tuple(stmt)
+            block = fetchBlock(stmt, _settings["blocksize"])
+            while (block):
+                rows.extend(convertRows(block, columns, converters, True))
+                block = fetchBlock(stmt, _settings["blocksize"])
             
             if (_settings["format"] == "array"):
                 rows.insert(0,columns)
@@ -746,46 +929,9 @@ def splitargs(arguments):
     else:
         step2 = step1
             
-    # Now we have a string without brackets. Start scanning for commas
+    # Now we have a string without brackets. Split it at the commas that are outside of quotes
             
-    quoteCH = ""
-    pos = 0
-    arg = ""
-    args = []
-            
-    while pos < len(step2):
-        ch = step2[pos]
-        if (quoteCH == ""):                     # Are we in a quote?
-            if (ch in ('"',"'")):               # Check to see if we are starting a quote
-                quoteCH = ch
-                arg = arg + ch
-                pos += 1
-            elif (ch == ","):                   # Are we at the end of a parameter?
-                arg = arg.strip()
-                args.append(arg)
-                arg = ""
-                inarg = False 
-                pos += 1
-            else:                               # Continue collecting the string
-                arg = arg + ch
-                pos += 1
-        else:
-            if (ch == quoteCH):                 # Are we at the end of a quote?
-                arg = arg + ch                  # Add the quote to the string
-                pos += 1                        # Increment past the quote
-                quoteCH = ""                    # Stop quote checking (maybe!)
-            else:
-                pos += 1
-                arg = arg + ch
-
-    if (quoteCH != ""):                         # So we didn't end our string
-        arg = arg.strip()
-        args.append(arg)
-    elif (arg != ""):                           # Something left over as an argument
-        arg = arg.strip()
-        args.append(arg)
-    else:
-        pass
+    args = [arg.strip() for arg in splitSQL(step2, ",")]
     
     results = []
     
@@ -820,6 +966,129 @@ def splitargs(arguments):
         
     return results        
 
+#------------------------------
+# Statement Cache
+#------------------------------
+
+def normalizeSQL(sql):
+    
+    # Collapse whitespace outside of quoted strings so that reformatted text maps to the same key
+    
+    return re.sub(r"""('(?:[^']|'')*'|"[^"]*")|\s+""",
+                  lambda m: m.group(1) if m.group(1) != None else " ",
+                  sql.strip())
+
+def outerText(sql):
+    
+    # The statement with quoted strings and everything inside parentheses removed, leaving the 
+    # clauses of the outermost select
+    
+    text = re.sub(r"""("[^"]*"|'(?:[^']|'')*')""", " ", sql)
+    while True:
+        inner = re.sub(r"\([^()]*\)", " ", text)
+        if (inner == text): return text
+        text = inner
+
+def prepareStmt(hdbc, sql):
+    
+    global _stmtCache, _stmtStats, _settings
+    
+    key = (id(hdbc), normalizeSQL(sql))                     # Handles belong to one connection
+    
+    stmt = _stmtCache.get(key)
+    if (stmt != None and id(stmt) in _stmtBusy):            # A generator is still fetching from it
+        _stmtStats["misses"] += 1
+        return ibm_db.prepare(hdbc,sql)
+    
+    if (stmt != None):                                      # Reuse the handle, closing any open cursor
+        _stmtCache.move_to_end(key)
+        _stmtStats["hits"] += 1
+        try:
+            ibm_db.free_result(stmt)
+        except:
+            pass
+        return stmt
+    
+    _stmtStats["misses"] += 1
+    
+    keyword = key[1].split(" ",1)[0].upper()
+    if (keyword in _ddlCommands):                           # DDL changes what cached plans depend on
+        clearStmtCache()
+        _procCache.clear()
+        return ibm_db.prepare(hdbc,sql)
+    
+    stmt = ibm_db.prepare(hdbc,sql)
+    if (stmt == False): return stmt
+    
+    _stmtCache[key] = stmt
+    _columnCache[id(stmt)] = None                           # Column descriptions are filled in later
+    while (len(_stmtCache) > _settings["cachesize"]):       # Drop the least recently used handle
+        _, oldest = _stmtCache.popitem(last=False)
+        _columnCache.pop(id(oldest), None)
+        
+    return stmt
+
+def clearStmtCache(hdbc=None):
+    
+    # Without hdbc every cached handle is dropped, otherwise only those prepared on that connection
+    
+    global _stmtCache, _columnCache
+    
+    if (hdbc == None):
+        _stmtCache.clear()
+        _columnCache.clear()
+        return
+    
+    for key in [key for key in list(_stmtCache.keys()) if key[0] == id(hdbc)]:
+        stmt = _stmtCache.pop(key, None)
+        _columnCache.pop(id(stmt), None)
+
+#------------------------------
+# Catalog Metadata Cache
+#------------------------------
+
+def clearMetadataCache():
+    
+    # Forget procedure lookups and column descriptions, for instance after a procedure is replaced
+    
+    global _procCache, _columnCache
+    
+    _procCache.clear()
+    for key in _columnCache.keys():
+        _columnCache[key] = None
+
+def describeSQL(sql):
+    
+    # Column names and types of a query, answered from the statement and metadata caches
+    
+    global _hdbc
+    
+    try:
+        stmt = prepareStmt(_hdbc, sql)
+        if (stmt == False):
+            db2_error()
+            return None
+    except Exception as err:
+        db2_error()
+        return None
+    
+    described = getColumns(stmt)
+    if (described == None): return None
+    columns, types = described
+    
+    if (_settings["format"] == "pandas"):
+        return pandas.DataFrame({"column" : columns, "type" : types})
+    elif (_settings["format"] == "json"):
+        return [{"column" : columns[ix], "type" : types[ix]} for ix in range(len(columns))]
+    else:
+        return [["COLUMN","TYPE"]] + [[columns[ix], types[ix]] for ix in range(len(columns))]
+    
+def stmtCacheStats():
+    
+    global _stmtCache, _stmtStats
+    
+    return {"hits" : _stmtStats["hits"], "misses" : _stmtStats["misses"], "size" : len(_stmtCache)}
+
 #------------------------------
 # Prepare/Execute 
 #------------------------------
@@ -850,20 +1119,17 @@ def parsePExec(hdbc, inSQL):
                 sql = sql.replace(found,markers)
                 findparm = re.search(pattern,sql)
             
-            stmt = ibm_db.prepare(hdbc,sql) # Check error code here
+            stmt = prepareStmt(hdbc,sql) # Check error code here
             if (stmt == False): 
                 db2_error()
                 return(False)
             
-            stmttext = str(stmt).strip()
-            stmtID = stmttext[33:48].strip()
-            
-            if (stmtID in _stmtID) == False:
-                _stmt.append(stmt)              # Prepare and return STMT to caller
-                _stmtID.append(stmtID)
-            else:
-                stmtIX = _stmtID.index(stmtID)
-                _stmt[stmtIX] = stmt
+            key = normalizeSQL(sql)
+            if (key in _stmtID) == False:       # Same text gets the same statement ID back
+                _stmtID[key] = "STMT" + str(len(_stmtID) + 1)
+                
+            stmtID = _stmtID[key]
+            _stmt[stmtID] = stmt                # Prepare and return STMT to caller
                  
             return(stmtID)
         
@@ -875,12 +1141,15 @@ def parsePExec(hdbc, inSQL):
         if (parmCount < 2): return(False)                    # No stmtID available
         
         stmtID = cParms[1].strip()
-        if (stmtID in _stmtID) == False:
+        if (stmtID in _stmt) == False:
             errormsg("Prepared statement not found or invalid.")
             return(False)
 
-        stmtIX = _stmtID.index(stmtID)
-        stmt = _stmt[stmtIX]
+        stmt = _stmt[stmtID]
+        
+        for text, ID in _stmtID.items():                # Changes may make cached answers stale
+            if (ID == stmtID and text.split(None,1)[0].upper() not in _readOnlyCommands):
+                invalidateResults(text)
 
         try:        
 
@@ -1002,18 +1271,30 @@ def parsePExec(hdbc, inSQL):
 # Fetch Result Sets
 #------------------------------
 
-def fetchResults(stmt):
+def fetchOptions():
+    
+    # The settings the fetch helpers use. Worker threads get a copy taken when the call was made, 
+    # since a later sql() call changes _settings while they are still fetching.
+    
+    return {option : _settings[option] for option in ["format","compact","decimal","native","blocksize","prefetch"]}
+
+def fetchResults(stmt, options=None):
+    
+    # With options (a fetchOptions() snapshot) the global SQLCODE and error fields are left alone
      
     global _sqlcode, _settings
     
+    worker = (options != None)
+    if (worker == False): options = fetchOptions()
+    
     rows = []
-    columns, types = getColumns(stmt)
+    columns, types = getColumns(stmt, worker == False)
     
     # By default we assume that the data will be an array
     is_array = True
     
     # Check what type of data we want returned - array or json
-    if (_settings["format"] == "json"):
+    if (options["format"] == "json"):
         is_array = False
     
     # Set column names to lowercase for JSON records
@@ -1021,71 +1302,513 @@ def fetchResults(stmt):
         columns = [col.lower() for col in columns] # Convert to lowercase for each of access
     
     # First row of an array has the column names in it
-    if (is_array == True):
+    if (is_array == True and options["compact"] == False):
         rows.append(columns)
         
-    result = ibm_db.fetch_tuple(stmt)
+    converters = converterPlan(types, exact=options["decimal"])
+    
     rowcount = 0
-    while (result):
-        
-        rowcount += 1
-        
-        if (is_array == True):
-            row = []
+    for block in fetchBlocks(stmt, options["blocksize"], options["prefetch"]):
+        rowcount += len(block)
+        if (options["compact"] == True):
+            rows.extend(zip(*convertColumns(block, converters)))
         else:
-            row = {}
-            
-        colcount = 0
-        for col in result:
-            try:
-                if (types[colcount] in ["int","bigint"]):
-                    if (is_array == True):
-                        row.append(int(col))
-                    else:
-                        row[columns[colcount]] = int(col)
-                elif (types[colcount] in ["decimal","real"]):
-                    if (is_array == True):
-                        row.append(float(col))
-                    else:
-                        row[columns[colcount]] = float(col)
-                elif (types[colcount] in ["date","time","timestamp"]):
-                    if (is_array == True):
-                        row.append(str(col))
-                    else:
-                        row[columns[colcount]] = str(col)
-                else:
-                    if (is_array == True):
-                        row.append(col)
-                    else:
-                        row[columns[colcount]] = col
-                        
-            except:
-                if (is_array == True):
-                    row.append(col)
-                else:
-                    row[columns[colcount]] = col
-                    
-            colcount += 1
-        
-        rows.append(row)
-        result = ibm_db.fetch_tuple(stmt)
+            rows.extend(convertRows(block, columns, converters, is_array))
         
-    if (rowcount == 0): 
+    if (worker == True):
+        pass
+    elif (rowcount == 0): 
         _sqlcode = 100        
     else:
         _sqlcode = 0
         
+    if (options["compact"] == True):
+        return ResultSet(columns, rows, is_array)
+        
     return rows
 
 #------------------------------
-# Pase Commit
+# Compact result sets
 #------------------------------
 
-def parseCommit(sql):
+class Record(object):
     
-    global _hdbc, _hdbi, _connected, _stmt, _stmtID, _stmtSQL
-
-    if (_connected == False): return                        # Nothing to do if we are not connected
+    # One json row. The column names live once in the result set and the values stay in the 
+    # tuple the driver returned, so a record costs two slots instead of a dictionary.
+    
+    __slots__ = ("_index", "_values")
+    
+    def __init__(self, index, values):
+        self._index = index
+        self._values = values
+        
+    def __getitem__(self, key):
+        return self._values[self._index[key]]
+    
+    def get(self, key, default=None):
+        if (key in self._index):
+            return self._values[self._index[key]]
+        return default
+    
+    def keys(self):
+        return list(self._index)
+    
+    def values(self):
+        return list(self._values)
+    
+    def items(self):
+        return list(zip(self._index, self._values))
+    
+    def todict(self):
+        return dict(zip(self._index, self._values))
+    
+    def __contains__(self, key):
+        return key in self._index
+    
+    def __iter__(self):
+        return iter(self._index)
+    
+    def __len__(self):
+        return len(self._values)
+    
+    def __eq__(self, other):
+        if (isinstance(other, Record) == True):
+            other = other.todict()
+        return self.todict() == other
+    
+    def __ne__(self, other):
+        return not self.__eq__(other)
+    
+    def __repr__(self):
+        return repr(self.todict())
+
+class ResultSet(object):
+    
+    # Answer set for the array and json formats with compact=True. The column names are held 
+    # once and every row is a tuple. It indexes like the list the other formats return: for 
+    # arrays element 0 is the column names, for json each element is a Record. It is not a list,
+    # so json.dumps() can't serialise it directly: use result.tojson() (which streams the rows), 
+    # or json.dumps(result.tolist()) for code that needs the plain lists and dictionaries.
+    
+    __slots__ = ("columns", "rows", "is_array", "_index")
+    
+    def __init__(self, columns, rows, is_array=True):
+        self.columns = list(columns)
+        self.rows = rows
+        self.is_array = is_array
+        self._index = {column : colcount for colcount, column in enumerate(self.columns)}
+        
+    def __len__(self):
+        if (self.is_array == True):
+            return len(self.rows) + 1
+        return len(self.rows)
+    
+    def __getitem__(self, item):
+        if (isinstance(item, slice) == True):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        if (item < 0): 
+            item += len(self)
+        if (item < 0 or item >= len(self)):
+            raise IndexError("result set index out of range")
+        if (self.is_array == True):
+            if (item == 0):
+                return self.columns
+            return self.rows[item - 1]
+        return Record(self._index, self.rows[item])
+    
+    def __iter__(self):
+        if (self.is_array == True):
+            yield self.columns
+            for row in self.rows:
+                yield row
+        else:
+            for row in self.rows:
+                yield Record(self._index, row)
+                
+    def __eq__(self, other):
+        return self.tolist() == other
+    
+    def __ne__(self, other):
+        return not self.__eq__(other)
+    
+    def __repr__(self):
+        return repr(self.tolist())
+    
+    def tolist(self):
+        
+        # The same lists and dictionaries that compact=False returns
+        
+        if (self.is_array == True):
+            return [self.columns] + [list(row) for row in self.rows]
+        return [dict(zip(self.columns, row)) for row in self.rows]
+    
+    def tojson(self, **kwargs):
+        
+        # Serialise one row at a time so no intermediate list of dictionaries is built
+        
+        dumps = json.JSONEncoder(default=str, **kwargs).encode
+        if (self.is_array == True):
+            rows = itertools.chain([self.columns], self.rows)
+        else:
+            rows = (dict(zip(self.columns, row)) for row in self.rows)
+        return "[" + ",".join([dumps(row) for row in rows]) + "]"
+
+#------------------------------
+# Convert a block of rows
+#------------------------------
+
+def convertColumns(block, converters):
+    
+    # Convert the block one column at a time
+    
+    return [convertColumn(column, converters[colcount]) for colcount, column in enumerate(zip(*block))]
+
+def convertRows(block, columns, converters, is_array):
+    
+    # Convert the block one column at a time and then put the rows back together
+    
+    values = convertColumns(block, converters)
+    
+    if (is_array == True):
+        return [list(row) for row in zip(*values)]
+    else:
+        return [dict(zip(columns, row)) for row in zip(*values)]
+
+#------------------------------
+# Type conversion plan
+#------------------------------
+
+def converterPlan(types, arrays=False, exact=None):
+    
+    #
+    # Pick the conversion for each column once from the result set description. DECIMAL goes to
+    # float unless exact (decimal=True by default), in which case it becomes decimal.Decimal. For NumPy
+    # arrays (arrays=True) only the Decimal conversion is needed, the array type does the rest.
+    #
+    
+    global _settings
+    
+    if (exact == None): exact = _settings["decimal"]
+    
+    plan = []
+    for coltype in types:
+        if (coltype == "decimal" and exact == True):
+            plan.append(decimal.Decimal)
+        elif (arrays == True):
+            plan.append(None)
+        elif (coltype in ["int","bigint"]):
+            plan.append(int)
+        elif (coltype in ["decimal","real"]):
+            plan.append(float)
+        elif (coltype in ["date","time","timestamp"]):
+            plan.append(str)
+        else:
+            plan.append(None)
+            
+    return plan
+
+def convertColumn(values, converter):
+    
+    # NULLs stay as None. A value the converter rejects is passed through unchanged.
+    
+    if (converter == None):
+        return values
+    
+    if (type(None) not in set(map(type, values))):          # Whole column in one call when there are no NULLs
+        try:
+            return list(map(converter, values))
+        except (TypeError, ValueError, ArithmeticError):
+            pass
+        
+    converted = []
+    for value in values:
+        try:
+            converted.append(converter(value) if value is not None else None)
+        except (TypeError, ValueError, ArithmeticError):
+            converted.append(value)
+    return converted
+
+#------------------------------
+# Fetch a block of rows
+#------------------------------
+
+def fetchBlock(stmt, blocksize):
+    
+    # Pull up to blocksize tuples from the statement handle. The loop runs inside islice
+    # so there is no Python level work per row other than the driver call itself.
+
+    fetch = functools.partial(ibm_db.fetch_tuple, stmt)
+    return list(itertools.islice(iter(fetch, False), blocksize))
+
+def fetchBlocks(stmt, blocksize, prefetch=None):
+    
+    # Generator of blocks until the answer set runs out. With prefetch=True the blocks are read 
+    # ahead by a worker thread, so the network wait for the next block overlaps the conversion 
+    # of the current one.
+    
+    if (prefetch == None): prefetch = _settings["prefetch"]
+    
+    if (prefetch == True):
+        for block in prefetchBlocks(stmt, blocksize):
+            yield block
+        return
+    
+    block = fetchBlock(stmt, blocksize)
+    while (block):
+        yield block
+        block = fetchBlock(stmt, blocksize)
+        
+def prefetchBlocks(stmt, blocksize, depth=2):
+    
+    #
+    # Double buffered fetch. The reader thread stays at most depth blocks ahead of the caller, 
+    # which keeps memory bounded when the caller is the slow side. None marks the end of the 
+    # answer set and a driver exception is handed over to be raised in the caller's thread.
+    #
+    
+    blocks = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    
+    def handOver(item):
+        while (stop.is_set() == False):
+            try:
+                blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+            
+    def reader():
+        try:
+            block = fetchBlock(stmt, blocksize)
+            while (block and stop.is_set() == False):
+                handOver(block)
+                block = fetchBlock(stmt, blocksize)
+            handOver(None)
+        except Exception as err:
+            handOver(err)
+            
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    try:
+        while True:
+            block = blocks.get()
+            if (block is None): 
+                return
+            if (isinstance(block, Exception) == True): 
+                raise block
+            yield block
+    finally:
+        stop.set()                                  # Also reached when the caller stops early
+        thread.join()                               # The handle is not shared once we return
+
+#------------------------------
+# Column conversion plan
+#------------------------------
+
+def columnPlan(types, exact=None, dates=True):
+    
+    # Decide the NumPy type for each column once, rather than checking the type of every cell.
+    # With dates=False DATE columns keep their datetime.date values.
+    
+    if (exact == None): exact = _settings["decimal"]
+    
+    plan = []
+    for coltype in types:
+        if (coltype in ["int","bigint","smallint"]):
+            plan.append("int64")
+        elif (coltype == "decimal" and exact == True):
+            plan.append("object")                           # Exact decimal.Decimal values
+        elif (coltype in ["decimal","real","double","float"]):
+            plan.append("float64")
+        elif (coltype == "timestamp" or (coltype == "date" and dates == True)):
+            plan.append("datetime64[us]")
+        else:
+            plan.append("object")
+            
+    return plan
+
+def arrayPlan(types, options):
+    
+    #
+    # Column types and conversions for the pandas and numpy formats. The pandas format keeps what
+    # pandas.read_sql returned: decimal.Decimal for DECIMAL and datetime.date for DATE. native=True
+    # gives float64 and datetime64 columns instead, which are smaller and faster but may round 
+    # DECIMAL values. The numpy format always uses the native types, apart from DECIMAL with decimal=True.
+    #
+    
+    exact, dates = options["decimal"], True
+    if (options["format"] == "pandas" and options["native"] == False):
+        exact, dates = True, False
+        
+    return columnPlan(types, exact, dates), converterPlan(types, True, exact)
+
+#------------------------------
+# Fill a column array
+#------------------------------
+
+def fillColumn(arrays, plan, colcount, start, values, converter=None):
+    
+    if (converter != None):
+        values = convertColumn(values, converter)
+    
+    try:
+        arrays[colcount][start:start+len(values)] = values
+    except (TypeError, ValueError):
+        # NULLs in an integer column or values the type can't hold. Demote the column 
+        # to float (NaN for NULL) and if that fails keep the raw Python objects.
+        if (plan[colcount] == "int64"):
+            plan[colcount] = "float64"
+        else:
+            plan[colcount] = "object"
+        arrays[colcount] = arrays[colcount].astype(plan[colcount])
+        try:
+            arrays[colcount][start:start+len(values)] = values
+        except (TypeError, ValueError):
+            plan[colcount] = "object"
+            arrays[colcount] = arrays[colcount].astype("object")
+            arrays[colcount][start:start+len(values)] = values
+
+#------------------------------
+# Fetch Columnar Result Sets
+#------------------------------
+
+def fetchColumns(stmt, blocksize=None, options=None):
+    
+    # With options (a fetchOptions() snapshot) the global SQLCODE and error fields are left alone
+    
+    global _sqlcode, _settings
+    
+    worker = (options != None)
+    if (worker == False): options = fetchOptions()
+    
+    columns, types = getColumns(stmt, worker == False)
+    plan, converters = arrayPlan(types, options)
+    
+    if (blocksize == None):
+        blocksize = options["blocksize"]
+    
+    capacity = blocksize
+    arrays = [numpy.empty(capacity, dtype=dtype) for dtype in plan]
+    rowcount = 0
+    
+    for block in fetchBlocks(stmt, blocksize, options["prefetch"]):
+        
+        count = len(block)
+        if (rowcount + count > capacity):                   # Double the arrays when we run out of room
+            while (rowcount + count > capacity):
+                capacity = capacity * 2
+            for colcount in range(len(arrays)):
+                arrays[colcount] = numpy.resize(arrays[colcount], capacity)
+        
+        for colcount, values in enumerate(zip(*block)):
+            fillColumn(arrays, plan, colcount, rowcount, values, converters[colcount])
+                    
+        rowcount += count
+        
+    if (worker == True):
+        pass
+    elif (rowcount == 0): 
+        _sqlcode = 100        
+    else:
+        _sqlcode = 0
+        
+    results = {}
+    for colcount in range(len(columns)):
+        results[columns[colcount]] = arrays[colcount][:rowcount]
+        
+    return results
+
+#------------------------------
+# Fetch a DataFrame
+#------------------------------
+
+def fetchDataFrame(stmt, blocksize=None, options=None):
+    
+    results = fetchColumns(stmt, blocksize, options)
+    return pandas.DataFrame(results, copy=False)
+
+#------------------------------
+# Fetch Result Sets in Chunks
+#------------------------------
+
+def fetchChunks(stmt, chunksize=None):
+    
+    # Returns a generator that yields the answer set chunksize rows at a time in the current format. 
+    # Only one chunk is held in memory, so the caller can start working before the last row arrives.
+    
+    global _settings
+    
+    if (chunksize == None):
+        chunksize = _settings["blocksize"]
+        
+    columns, types = getColumns(stmt)
+    if (_settings["format"] in ["pandas","numpy"]):
+        plan, converters = arrayPlan(types, fetchOptions())
+    else:
+        plan, converters = None, converterPlan(types)
+    
+    if (_settings["format"] == "json"):
+        columns = [col.lower() for col in columns]
+        
+    format, compact = _settings["format"], _settings["compact"]     # The caller may run sql() between chunks
+    
+    _stmtBusy.add(id(stmt))                                # prepareStmt must not reuse the handle meanwhile
+    chunks = streamChunks(stmt, chunksize, columns, plan, converters, format, compact, _settings["prefetch"])
+    weakref.finalize(chunks, _stmtBusy.discard, id(stmt))  # Also freed if the generator is never started
+    return chunks
+
+def streamChunks(stmt, chunksize, columns, plan, converters, format, compact, prefetch):
+    
+    global _sqlcode
+    
+    rowcount = 0
+    try:
+        for block in fetchBlocks(stmt, chunksize, prefetch):
+            rowcount += len(block)
+            yield convertBlock(block, columns, plan, converters, format, compact)
+    except Exception as err:
+        db2_error()
+        return
+    finally:
+        _stmtBusy.discard(id(stmt))
+        
+    if (rowcount == 0): 
+        _sqlcode = 100        
+    else:
+        _sqlcode = 0
+
+def convertBlock(block, columns, plan, converters, format, compact=False):
+    
+    # One block of rows in the given format. Array blocks carry no column name row.
+    
+    if (format in ["pandas","numpy"]):
+        count = len(block)
+        arrays = [numpy.empty(count, dtype=dtype) for dtype in plan]
+        for colcount, values in enumerate(zip(*block)):
+            fillColumn(arrays, plan, colcount, 0, values, converters[colcount])  # Demotions carry over
+        chunk = dict(zip(columns, arrays))
+        if (format == "pandas"):
+            chunk = pandas.DataFrame(chunk, copy=False)
+        return chunk
+    
+    is_array = True
+    if (format == "json"):
+        is_array = False
+        
+    if (compact == True):
+        return ResultSet(columns, list(zip(*convertColumns(block, converters))), is_array)
+    else:
+        return convertRows(block, columns, converters, is_array)
+
+#------------------------------
+# Pase Commit
+#------------------------------
+
+def parseCommit(sql):
+    
+    global _hdbc, _hdbi, _connected, _stmt, _stmtID, _stmtSQL
+
+    if (_connected == False): return                        # Nothing to do if we are not connected
     
     cParms = sql.split()
     if (len(cParms) == 0): return                           # Nothing to do but this shouldn't happen
@@ -1100,8 +1823,9 @@ def parseCommit(sql):
                 if (keyword == "HOLD"):
                     return
             
-            del _stmt[:]
-            del _stmtID[:]
+            _stmt.clear()
+            _stmtID.clear()
+            clearStmtCache()
 
         except Exception as err:
             db2_error()
@@ -1111,8 +1835,10 @@ def parseCommit(sql):
     if (keyword == "ROLLBACK"):                             # Rollback the work that was done
         try:
             result = ibm_db.rollback(_hdbc)                  # Rollback the connection
-            del _stmt[:]
-            del _stmtID[:]            
+            invalidateResults(sql)                          # Cached answers may hold undone changes
+            _stmt.clear()
+            _stmtID.clear()
+            clearStmtCache()
 
         except Exception as err:
             db2_error()
@@ -1144,35 +1870,21 @@ def parseCommit(sql):
 
 def splitSQL(inputString, delimiter):
      
-    pos = 0
-    arg = ""
     results = []
-    quoteCH = ""
     
     inSQL = inputString.strip()
     if (len(inSQL) == 0): return(results)       # Not much to do here - no args found
-            
-    while pos < len(inSQL):
-        ch = inSQL[pos]
-        pos += 1
-        if (ch in ('"',"'")):                   # Is this a quote characters?
-            arg = arg + ch                      # Keep appending the characters to the current arg
-            if (ch == quoteCH):                 # Is this quote character we are in
-                quoteCH = ""
-            elif (quoteCH == ""):               # Create the quote
-                quoteCH = ch
-            else:
-                None
-        elif (quoteCH != ""):                   # Still in a quote
-            arg = arg + ch
-        elif (ch == delimiter):                 # Is there a delimiter?
-            results.append(arg)
-            arg = ""
+    
+    arg = []
+    for kind, value in tokenizeSQL(inSQL, delimiter):
+        if (kind == "delim"):                   # Delimiters inside quotes or comments never get here
+            results.append("".join(arg))
+            arg = []
         else:
-            arg = arg + ch
+            arg.append(value)
             
-    if (arg != ""):
-        results.append(arg)
+    if (len(arg) > 0):
+        results.append("".join(arg))
         
     return(results)
 
@@ -1204,6 +1916,11 @@ def setOptions(local_ns):
             _settings["format"] = "array"
         elif (value == "json"):
             _settings["format"] = "json"
+        elif (value == "numpy"):
+            if (_settings["numpy"] == True):
+                _settings["format"] = "numpy"
+            else:
+                print("NUMPY results format unavailable due to NUMPY libraries not loaded")
         else:
             print("Unknown FORMAT option: " + value)
 
@@ -1217,6 +1934,101 @@ def setOptions(local_ns):
     if (value == False):
         _settings["quotes"] = False
 
+    value = getLocal("bind",local_ns)
+
+    if (value == True):
+        _settings["bind"] = True
+    else:
+        _settings["bind"] = False
+
+    value = getLocal("parallel",local_ns)
+
+    if (value != None):
+        _settings["parallel"] = int(value)
+    else:
+        _settings["parallel"] = 1
+
+    value = getLocal("timing",local_ns)
+
+    if (value == True):
+        _settings["timing"] = True
+    else:
+        _settings["timing"] = False
+
+    value = getLocal("cache",local_ns)
+
+    if (value == True):
+        _settings["cache"] = True
+    else:
+        _settings["cache"] = False
+
+    value = getLocal("disk",local_ns)
+
+    if (value == True):
+        if (_settings["arrow"] == True):
+            _settings["disk"] = True
+        else:
+            _settings["disk"] = False
+            print("DISK cache unavailable due to PYARROW libraries not loaded")
+    else:
+        _settings["disk"] = False
+
+    value = getLocal("refresh",local_ns)
+
+    if (value == True):
+        _settings["refresh"] = True
+    else:
+        _settings["refresh"] = False
+
+    value = getLocal("ttl",local_ns)
+
+    if (value != None):
+        _settings["ttl"] = float(value)
+    else:
+        _settings["ttl"] = 300
+
+    value = getLocal("describe",local_ns)
+
+    if (value == True):
+        _settings["describe"] = True
+    else:
+        _settings["describe"] = False
+
+    value = getLocal("decimal",local_ns)
+
+    if (value == True):
+        _settings["decimal"] = True
+    else:
+        _settings["decimal"] = False
+
+    value = getLocal("native",local_ns)
+
+    if (value == True):
+        _settings["native"] = True
+    else:
+        _settings["native"] = False
+
+    value = getLocal("compact",local_ns)
+
+    if (value == True):
+        _settings["compact"] = True
+    else:
+        _settings["compact"] = False
+
+    value = getLocal("prefetch",local_ns)
+
+    if (value == True):
+        _settings["prefetch"] = True
+    else:
+        _settings["prefetch"] = False
+
+    value = getLocal("blocksize",local_ns)
+
+    if (value != None):
+        _settings["blocksize"] = int(value)
+    else:
+        _settings["blocksize"] = 10000
+
     return    
 #------------------------------
 # Main SQL Code
@@ -1237,9 +2049,23 @@ def sql(sqlstmts=None,**local_ns):
     _sqlstate = "0"
     _sqlerror = ""
     _sqlcode = 0
+    _asyncError.set(None)
+
+    script = getLocal("file",local_ns)
+    if (script != None):                                          # Run a SQL file instead of the cell
+        commitcount = getLocal("commitcount",local_ns)
+        return run_script(script, 
+                          commitcount=100 if commitcount == None else int(commitcount),
+                          checkpoint=getLocal("checkpoint",local_ns),
+                          restart=(getLocal("restart",local_ns) == True),
+                          delimiter=getLocal("delim",local_ns))
 
     if (sqlstmts == None): return
 
+    name = getLocal("conn",local_ns)
+    if (name != None):                                            # Run on a named pooled connection
+        return useConnection(name, sqlstmts, local_ns)
+
     setOptions(local_ns)
  
     sqlstmts = sqlstmts.strip()
@@ -1261,6 +2087,7 @@ def sql(sqlstmts=None,**local_ns):
         result = parsePExec(_hdbc, remainder)
         return(result)    
     elif (sqlType == "CALL"):
+        invalidateResults(remainder)                              # A procedure can change anything
         result = parseCall(_hdbc, remainder, local_ns)
         return(result)
     else:
@@ -1271,47 +2098,106 @@ def sql(sqlstmts=None,**local_ns):
             errormsg('A CONNECT statement must be issued before issuing SQL statements.')
             return      
     
-    runSQL = re.sub('.*?--.*$',"",sqlstmts,flags=re.M)
+    runSQL = stripComments(sqlstmts)
     remainder = runSQL.replace("\n"," ") 
     
     sqlLines = splitSQL(remainder,_settings["delim"])
 
+    if (_settings["parallel"] > 1 and len(sqlLines) > 1):     # Independent queries run side by side
+        results = runParallel(sqlLines, local_ns)
+        if (results != None): return results
+
     flag_cell = True
                   
     # For each line figure out if you run it as a command (db2) or select (sql)
 
     for sqlin in sqlLines:          # Run each command
         
-        sqlType, sql = sqlParser(sqlin,local_ns)                           # Parse the SQL  
+        parms = None
+        if (_settings["bind"] == True): parms = []
+        
+        sqlType, sql = sqlParser(sqlin,local_ns,parms)                     # Parse the SQL  
         if (sql.strip() == ""): continue
+        
+        if (_settings["describe"] == True):                   # Describe the answer set, don't run it
+            return describeSQL(sql)
+        
+        cacheKey = None
+        if (sqlType not in _readOnlyCommands):                # Changes may make cached answers stale
+            invalidateResults(sql)
+        elif (_settings["cache"] == True):
+            cacheKey = resultKey(sql, parms)
+            cached = getCachedResult(cacheKey)
+            if (cached is not None): return cached
+            
+        diskKey = None
+        if (sqlType in _readOnlyCommands and _settings["disk"] == True and _settings["format"] in ["pandas","numpy"]):
+            diskKey = diskResultKey(sql, parms)
+            if (_settings["refresh"] == False):               # refresh=True always goes back to the database
+                cached = readDiskResult(diskKey, sql)
+                if (cached is not None): 
+                    if (cacheKey != None): putCachedResult(cacheKey, sql, cached)
+                    return cached
+            
+        timer = startTiming(sql)
             
         try:                                                  # See if we have an answer set
-            stmt = ibm_db.prepare(_hdbc,sql)
+            stmt = prepareStmt(_hdbc,sql)
+            markTiming(timer, "prepare")
             if (ibm_db.num_fields(stmt) == 0):                # No, so we just execute the code
-                result = ibm_db.execute(stmt)                 # Run it      
+                result = executeStmt(stmt,parms)              # Run it      
+                markTiming(timer, "execute")
                                  
                 if (result == False):                         # Error executing the code
                     db2_error() 
+                    finishTiming(timer)
                     continue
                     
                 rowcount = ibm_db.num_rows(stmt)    
+                finishTiming(timer, rowcount=rowcount)
             
                 if (rowcount == 0):
                     errormsg("No rows found", 100, "00100")
 
                 continue                                      # Continue running
             
+            elif (_settings["format"] == "numpy"):                      # Dictionary of column arrays
+                try:
+                    result = executeStmt(stmt,parms)          # Run it
+                    markTiming(timer, "execute")
+                    if (result == False):                         # Error executing the code
+                        db2_error()  
+                        finishTiming(timer)
+                        return
+                        
+                    results = fetchColumns(stmt)
+                    markTiming(timer, "fetch")
+                    finishTiming(timer, results)
+                    if (cacheKey != None): putCachedResult(cacheKey, sql, results)
+                    if (diskKey != None): writeDiskResult(diskKey, results)
+                    return(results)
+                          
+                except Exception as err:
+                    db2_error()
+                    return
+
             elif (_settings["format"] == "array" or 
                   _settings["format"] == "json" ):                     # raw, json, format json
                 row_count = 0
                 resultSet = []
                 try:
-                    result = ibm_db.execute(stmt)             # Run it
+                    result = executeStmt(stmt,parms)          # Run it
+                    markTiming(timer, "execute")
                     if (result == False):                         # Error executing the code
                         db2_error()  
+                        finishTiming(timer)
                         return
                         
-                    return(fetchResults(stmt))
+                    results = fetchResults(stmt)
+                    markTiming(timer, "fetch")
+                    finishTiming(timer, results)
+                    if (cacheKey != None): putCachedResult(cacheKey, sql, results)
+                    return(results)
                           
                 except Exception as err:
                     db2_error()
@@ -1320,7 +2206,18 @@ def sql(sqlstmts=None,**local_ns):
             else:
                 
                 try:
-                    df = pandas.read_sql(sql,_hdbi)
+                    result = executeStmt(stmt,parms)          # Run the statement we already prepared
+                    markTiming(timer, "execute")
+                    if (result == False):                         # Error executing the code
+                        db2_error()  
+                        finishTiming(timer)
+                        return
+                        
+                    results = fetchColumns(stmt)
+                    markTiming(timer, "fetch")
+                    df = pandas.DataFrame(results, copy=False)
+                    markTiming(timer, "build")
+                    finishTiming(timer, df)
         
                 except Exception as err:
                     db2_error()
@@ -1331,12 +2228,1145 @@ def sql(sqlstmts=None,**local_ns):
                     continue                    
             
                 flag_output = True
+                if (cacheKey != None): putCachedResult(cacheKey, sql, df)
+                if (diskKey != None): writeDiskResult(diskKey, df)
                 return df # print(df.to_string())
         
         except:
             db2_error()
             continue # return
                               
+#------------------------------
+# Statement Timing
+#------------------------------
+
+def startTiming(sql):
+    
+    return {"sql" : sql, "prepare" : 0.0, "execute" : 0.0, "fetch" : 0.0, "build" : 0.0, 
+            "total" : 0.0, "rows" : 0, "bytes" : 0, "start" : time.perf_counter()}
+
+def markTiming(timer, phase):
+    
+    # Charge the time since the last mark to this phase
+    
+    now = time.perf_counter()
+    timer[phase] = now - timer["start"] - timer["total"]
+    timer["total"] = now - timer["start"]
+
+def finishTiming(timer, result=None, rowcount=None):
+    
+    # Work out the rows and bytes returned, keep the record and pass it to every hook
+    
+    global _timings, _timingHooks, _settings
+    
+    if (rowcount != None):
+        rows = max(rowcount, 0)
+        size = 0
+    else:
+        rows, size = resultSize(result)
+        
+    record = dict(timer)
+    del record["start"]
+    record["rows"] = rows
+    record["bytes"] = size
+    _timings.append(record)
+    
+    if (_settings["timing"] == True):
+        print("{0:8.3f} ms prepare {1:8.3f} ms execute {2:8.3f} ms fetch {3:8.3f} ms build {4:10d} rows {5:12d} bytes  {6}".format(
+              record["prepare"]*1000, record["execute"]*1000, record["fetch"]*1000, record["build"]*1000,
+              record["rows"], record["bytes"], record["sql"].strip()[:60]))
+        
+    for hook in list(_timingHooks):
+        try:
+            hook(record)
+        except Exception as err:
+            pass
+        
+def resultSize(result):
+    
+    # Rows and bytes in an answer set. The byte count includes the values the arrays or rows 
+    # point to (strings, Decimals and so on), so cachebytes bounds the memory really held.
+    
+    rows = 0
+    size = 0
+    if (_settings["pandas"] == True and isinstance(result, pandas.DataFrame) == True):
+        rows = len(result)
+        size = int(result.memory_usage(index=False, deep=True).sum())
+    elif (isinstance(result, dict) == True):
+        for column in result.values():
+            rows = len(column)
+            size += column.nbytes
+            if (column.dtype == object): size += sum([sys.getsizeof(value) for value in column])
+    elif (isinstance(result, list) == True):
+        rows = len(result)
+        if (len(result) > 0 and isinstance(result[0], list) == True): rows -= 1   # Array column names
+        size = sys.getsizeof(result) + sum([valueSize(row) for row in result])
+    elif (isinstance(result, ResultSet) == True):
+        rows = len(result.rows)
+        size = sys.getsizeof(result.rows) + sum([valueSize(row) for row in result.rows])
+        
+    return rows, size
+
+def valueSize(row):
+    
+    # Bytes held by a row and the values in it
+    
+    if (isinstance(row, dict) == True):
+        values = row.values()
+    elif (isinstance(row, (list, tuple)) == True):
+        values = row
+    else:
+        return sys.getsizeof(row)
+    
+    return sys.getsizeof(row) + sum([sys.getsizeof(value) for value in values])
+        
+def addTimingHook(hook):
+    
+    # hook(record) is called after every statement sql() runs
+    
+    global _timingHooks
+    
+    if (hook not in _timingHooks):
+        _timingHooks.append(hook)
+        
+def removeTimingHook(hook):
+    
+    global _timingHooks
+    
+    if (hook in _timingHooks):
+        _timingHooks.remove(hook)
+        
+def sqlTimings(reset=False):
+    
+    # The most recent statement timings as a DataFrame (or a list of dictionaries without pandas)
+    
+    global _timings, _settings
+    
+    records = list(_timings)
+    if (reset == True):
+        _timings.clear()
+        
+    if (_settings["pandas"] == True):
+        return pandas.DataFrame(records, columns=["sql","prepare","execute","fetch","build","total","rows","bytes"])
+    else:
+        return records
+
+#------------------------------
+# Result Cache
+#------------------------------
+
+def resultKey(sql, parms):
+    
+    # Answers depend on the statement, the bound values, the connection and the output format
+    
+    if (parms == None): parms = []
+    return (normalizeSQL(sql), repr(parms), _dsn, _settings["format"], _settings["decimal"], _settings["native"], 
+            _settings["compact"])
+
+def getCachedResult(key):
+    
+    global _resultCache, _resultStats
+    
+    entry = _resultCache.get(key)
+    if (entry == None):
+        _resultStats["misses"] += 1
+        return None
+    
+    if (time.time() > entry["expires"]):                # Too old, so go back to the database
+        dropCachedResult(key)
+        _resultStats["misses"] += 1
+        return None
+    
+    _resultCache.move_to_end(key)
+    _resultStats["hits"] += 1
+    return copyResult(entry["result"])
+
+def putCachedResult(key, sql, result):
+    
+    global _resultCache, _resultStats, _resultBytes, _settings
+    
+    rows, size = resultSize(result)
+    if (size > _settings["cachebytes"]): return           # Would push everything else out
+    
+    if (key in _resultCache): dropCachedResult(key)
+    
+    _resultCache[key] = {"result" : copyResult(result), "sql" : normalizeSQL(sql).upper(),
+                         "bytes" : size, "expires" : time.time() + _settings["ttl"]}
+    _resultBytes += size
+    
+    while (_resultBytes > _settings["cachebytes"]):       # Least recently used answers go first
+        oldest = next(iter(_resultCache))
+        dropCachedResult(oldest)
+        _resultStats["evictions"] += 1
+
+def dropCachedResult(key):
+    
+    global _resultCache, _resultBytes
+    
+    entry = _resultCache.pop(key)
+    _resultBytes -= entry["bytes"]
+
+def copyResult(result):
+    
+    # Hand out copies so changes made by the caller never leak into the cache
+    
+    if (_settings["pandas"] == True and isinstance(result, pandas.DataFrame) == True):
+        return result.copy()
+    elif (isinstance(result, dict) == True):
+        return {column : values.copy() for column, values in result.items()}
+    elif (isinstance(result, list) == True):
+        return [row.copy() for row in result]
+    elif (isinstance(result, ResultSet) == True):
+        return ResultSet(result.columns, list(result.rows), result.is_array)   # Rows are tuples
+    else:
+        return result
+
+def invalidateResults(sql):
+    
+    #
+    # Drop cached answers that mention the table changed by an INSERT, UPDATE, DELETE, MERGE 
+    # or DDL statement. If the target can't be found every cached answer is dropped.
+    #
+    
+    global _resultCache, _resultStats, _changedTables
+    
+    found = _changedTable.match(sql)
+    if (found == None):
+        _changedTables[None] = time.time()                  # Answers on disk written before now are stale
+        dropped = list(_resultCache.keys())
+    else:
+        table = found.group(1).split(".")[-1].strip().strip('"').upper()
+        _changedTables[table] = time.time()
+        pattern = tablePattern(table)
+        dropped = [key for key, entry in _resultCache.items() if pattern.search(entry["sql"]) != None]
+        
+    for key in dropped:
+        dropCachedResult(key)
+        _resultStats["invalidations"] += 1
+        
+def tablePattern(table):
+    
+    return re.compile(r'(?<![\w$#@])"?' + re.escape(table) + r'"?(?![\w$#@])')
+
+def lastChanged(sql):
+    
+    # When a statement in this session last changed a table the query reads (0 if never)
+    
+    global _changedTables
+    
+    text = normalizeSQL(sql).upper()
+    changed = [when for table, when in _changedTables.items() if table == None or tablePattern(table).search(text) != None]
+    return max(changed, default=0)
+
+def clearResultCache():
+    
+    global _resultCache, _resultBytes
+    
+    _resultCache.clear()
+    _resultBytes = 0
+    
+def resultCacheStats():
+    
+    global _resultCache, _resultStats, _resultBytes
+    
+    stats = dict(_resultStats)
+    stats["entries"] = len(_resultCache)
+    stats["bytes"] = _resultBytes
+    return stats
+
+#------------------------------
+# Disk Cache
+#------------------------------
+
+def diskResultKey(sql, parms):
+    
+    # Content address for an answer set. The key comes from the connection in use (USE can switch 
+    # it) and the password is left out of the hash on purpose.
+    
+    if (parms == None): parms = []
+    
+    connection = re.sub(r"PWD=[^;]*;?", "", _dsn or "", flags=re.I)
+    identity = "\n".join([normalizeSQL(sql), repr(parms), connection, _settings["format"], 
+                          str(_settings["decimal"]), str(_settings["native"])])
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+def readDiskResult(key, sql):
+    
+    # Memory map the Arrow file so columns are read straight from the page cache. The file time 
+    # is when the answer was written; files older than diskttl, or written before this session 
+    # changed one of the tables the query reads, are removed instead of being returned.
+    
+    global _settings
+    
+    path = os.path.join(_settings["diskdir"], key + ".arrow")
+    
+    try:
+        written = os.stat(path).st_mtime
+    except Exception as err:
+        return None
+    
+    if (time.time() - written > _settings["diskttl"] or lastChanged(sql) >= written):
+        try:
+            os.remove(path)
+        except Exception as err:
+            pass
+        return None
+    
+    try:
+        with pyarrow.memory_map(path, "r") as source:
+            table = pyarrow.ipc.open_file(source).read_all()
+        os.utime(path, (time.time(), written))             # Last use goes in the access time
+    except Exception as err:
+        return None
+    
+    if (_settings["format"] == "pandas"):
+        return table.to_pandas()
+    else:
+        return {name : table.column(name).to_numpy(zero_copy_only=False) for name in table.column_names}
+
+def writeDiskResult(key, result):
+    
+    global _settings
+    
+    try:
+        if (isinstance(result, dict) == True):
+            table = pyarrow.table(result)
+        else:
+            table = pyarrow.Table.from_pandas(result, preserve_index=False)
+            
+        if (os.path.isdir(_settings["diskdir"]) == False):
+            os.makedirs(_settings["diskdir"])
+            
+        # Write to a temporary file first so a reader never sees half an answer set
+        
+        handle, work = tempfile.mkstemp(suffix=".tmp", dir=_settings["diskdir"])
+        with os.fdopen(handle, "wb") as sink:
+            with pyarrow.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(work, os.path.join(_settings["diskdir"], key + ".arrow"))
+        
+    except Exception as err:                                # Columns Arrow can't hold are just not cached
+        return
+    
+    trimDiskCache()
+
+def trimDiskCache():
+    
+    # Remove the least recently used files (by access time) until the directory fits in diskbytes
+    
+    global _settings
+    
+    try:
+        files = []
+        for name in os.listdir(_settings["diskdir"]):
+            if (name.endswith(".arrow") == False): continue
+            path = os.path.join(_settings["diskdir"], name)
+            info = os.stat(path)
+            files.append((info.st_atime, info.st_size, path))
+    except Exception as err:
+        return
+    
+    total = sum([size for _, size, _ in files])
+    for _, size, path in sorted(files):
+        if (total <= _settings["diskbytes"]): break
+        try:
+            os.remove(path)
+            total -= size
+        except Exception as err:
+            pass
+
+def clearDiskCache():
+    
+    global _settings
+    
+    if (os.path.isdir(_settings["diskdir"]) == False): return
+    
+    for name in os.listdir(_settings["diskdir"]):
+        if (name.endswith(".arrow") == True):
+            os.remove(os.path.join(_settings["diskdir"], name))
+
+#------------------------------
+# Run queries in parallel
+#------------------------------
+
+def runParallel(sqlLines, local_ns):
+    
+    #
+    # Run each statement on its own pooled connection using parallel worker threads and return a 
+    # list with one result per statement in cell order. Only read-only queries are run this way;
+    # None tells the caller to run the cell one statement at a time.
+    #
+    
+    global _settings, _dsn, _sqlcode, _sqlstate, _sqlerror
+    
+    statements = []
+    for sqlin in sqlLines:
+        parms = None
+        if (_settings["bind"] == True): parms = []
+        sqlType, sql = sqlParser(sqlin,local_ns,parms)
+        if (sql.strip() == ""): continue
+        if (sqlType not in _readOnlyCommands): return None
+        statements.append((sql, parms))
+        
+    if (_dsn == None or len(statements) < 2): return None
+    
+    def run(statement):
+        timers = []
+        result, error = runStatements(_dsn, [statement], options, timers)
+        return result, error, timers
+    
+    workers = min(_settings["parallel"], len(statements))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        options = fetchOptions()
+        answers = list(executor.map(run, statements))
+        
+    results = []
+    errors = []
+    for result, error, timers in answers:
+        for timer in timers:                                # Records and hooks in cell order
+            finishTiming(timer, result)
+        results.append(result)
+        if (error != None and error[1] != 100): errors.append(error)
+        
+    if (len(errors) > 0):                                   # Report the first failure
+        _sqlerror, _sqlcode, _sqlstate = errors[0]
+    else:
+        _sqlerror, _sqlcode, _sqlstate = "", 0, "0"
+        
+    return results
+
+#------------------------------
+# Run statements on a pooled connection
+#------------------------------
+
+def runStatements(dsn, statements, options, timings=None):
+    
+    #
+    # Worker for runParallel and asql. Runs the (sql, parms) pairs in order on one pooled 
+    # connection and returns the answer set of the first query along with an error tuple 
+    # (message, sqlcode, sqlstate). options is the fetchOptions() snapshot taken by the caller,
+    # and the global settings and error fields are never touched. With a timings list the 
+    # timer of each statement run is added to it for the caller to finish.
+    #
+    
+    format = options["format"]
+    
+    stmt = None
+    try:
+        hdbc, hdbi = checkoutConnection(dsn)
+    except Exception as err:
+        return None, parseErrmsg(ibm_db.conn_errormsg())
+    
+    try:
+        for sql, parms in statements:
+            timer = startTiming(sql)
+            if (timings != None): timings.append(timer)
+            stmt = ibm_db.prepare(hdbc, sql)
+            markTiming(timer, "prepare")
+            if (executeStmt(stmt, parms) == False):
+                return None, parseErrmsg(ibm_db.stmt_errormsg(stmt))
+            markTiming(timer, "execute")
+            
+            if (ibm_db.num_fields(stmt) == 0): continue       # Not a query, so keep going
+            
+            if (format == "pandas"):
+                result = fetchDataFrame(stmt, options=options)
+                rowcount = len(result)
+            elif (format == "numpy"):
+                result = fetchColumns(stmt, options=options)
+                rowcount = max([len(column) for column in result.values()] + [0])
+            else:
+                result = fetchResults(stmt, options)
+                rowcount = len(result)
+                if (format == "array"): rowcount -= 1         # First row holds the column names
+            markTiming(timer, "fetch")
+                
+            if (rowcount == 0):
+                return result, ("No rows found", 100, "00100")
+            
+            return result, None
+        
+        return None, None
+        
+    except Exception as err:
+        if (stmt != None and stmt != False):
+            return None, parseErrmsg(ibm_db.stmt_errormsg(stmt))
+        else:
+            return None, parseErrmsg(ibm_db.stmt_errormsg())
+        
+    finally:
+        checkinConnection(dsn, hdbc, hdbi)
+
+#------------------------------
+# Asynchronous SQL Code
+#------------------------------
+
+async def asql(sqlstmts=None,**local_ns):
+    
+    #
+    # Coroutine version of sql(). The statements run on a pooled connection in an executor thread
+    # so the event loop stays free, and at most _settings["concurrency"] calls run at once. The 
+    # error from this call is what sqlcode() reports inside the awaiting task.
+    #
+    
+    global _settings, _dsn, _connected, _asyncLimit
+    
+    _asyncError.set(("", 0, "0"))
+    
+    if (sqlstmts == None): return
+    
+    setOptions(local_ns)
+    options = fetchOptions()                      # Other calls may change the settings while we wait
+    
+    sqlstmts = sqlstmts.strip()
+    if (len(sqlstmts) == 0): return
+    
+    sqlType, _ = sqlParser(sqlstmts,local_ns)
+    if (sqlType in ["CONNECT","COMMIT","ROLLBACK","AUTOCOMMIT","PREPARE","EXECUTE","CALL"]):
+        _asyncError.set(("asql() does not run " + sqlType + " statements, use sql() instead.", -99999, "-99999"))
+        return None
+    
+    if (_connected == False):
+        if (db2_doConnect() == False):
+            _asyncError.set(('A CONNECT statement must be issued before issuing SQL statements.', -99999, "-99999"))
+            return None
+    
+    runSQL = stripComments(sqlstmts)
+    remainder = runSQL.replace("\n"," ") 
+    
+    statements = []
+    for sqlin in splitSQL(remainder,_settings["delim"]):
+        parms = None
+        if (_settings["bind"] == True): parms = []
+        sqlType, sql = sqlParser(sqlin,local_ns,parms)
+        if (sql.strip() == ""): continue
+        if (sqlType not in _readOnlyCommands): invalidateResults(sql)
+        statements.append((sql, parms))
+        
+    loop = asyncio.get_running_loop()
+    if (_asyncLimit.get(loop) == None):
+        _asyncLimit[loop] = asyncio.Semaphore(_settings["concurrency"])
+        
+    async with _asyncLimit[loop]:
+        result, error = await loop.run_in_executor(None, runStatements, _dsn, statements, options)
+        
+    if (error != None):
+        _asyncError.set(error)
+        
+    return result
+
+#------------------------------
+# Streaming SQL Code
+#------------------------------
+
+def sql_iter(sqlstmts=None,chunksize=None,**local_ns):
+    
+    # Same as sql() except that the answer set of the first query is returned as a generator 
+    # of chunks (DataFrames, column arrays, arrays or JSON records) of chunksize rows each. The
+    # statements run when sql_iter is called; only the fetching waits for the generator. Without
+    # a query (or after an error) the generator is empty.
+    
+    global _settings
+    global _hdbc, _hdbi, _connected, _sqlstate, _sqlerror, _sqlcode
+    
+    _sqlstate = "0"
+    _sqlerror = ""
+    _sqlcode = 0
+    _asyncError.set(None)
+
+    if (sqlstmts == None): return iter([])
+
+    setOptions(local_ns)
+ 
+    sqlstmts = sqlstmts.strip()
+    
+    if (len(sqlstmts) == 0): return iter([])                      # Nothing to do here
+    
+    if (_connected == False):
+        if (db2_doConnect() == False):
+            errormsg('A CONNECT statement must be issued before issuing SQL statements.')
+            return iter([])
+    
+    runSQL = stripComments(sqlstmts)
+    remainder = runSQL.replace("\n"," ") 
+    
+    sqlLines = splitSQL(remainder,_settings["delim"])
+
+    for sqlin in sqlLines:          # Run each command until we find a query
+        
+        parms = None
+        if (_settings["bind"] == True): parms = []
+        
+        sqlType, sql = sqlParser(sqlin,local_ns,parms)                     # Parse the SQL  
+        if (sql.strip() == ""): continue
+        
+        if (sqlType not in _readOnlyCommands):                # Changes may make cached answers stale
+            invalidateResults(sql)
+            
+        try:
+            stmt = prepareStmt(_hdbc,sql)
+            result = executeStmt(stmt,parms)                  # Run it      
+            if (result == False):                             # Error executing the code
+                db2_error() 
+                continue
+        except:
+            db2_error()
+            continue
+            
+        if (ibm_db.num_fields(stmt) == 0): continue           # Not a query, so keep going
+        
+        try:
+            return fetchChunks(stmt, chunksize)
+        except Exception as err:
+            db2_error()
+            return iter([])
+            
+    return iter([])
+
+#------------------------------
+# Export an answer set as JSON
+#------------------------------
+
+def sql_export(sqlstmts, target, format="ndjson", arrays=False, chunksize=None, **local_ns):
+    
+    #
+    # Write the answer set of the first query to target without building the whole result. Target 
+    # is a file name, an open file or a socket. format="ndjson" writes one row per line and 
+    # format="json" writes a single JSON array. Rows are objects keyed by the lowercase column 
+    # names, or with arrays=True lists preceded by a row of column names. Each chunk is encoded 
+    # straight from the fetched tuples and written before the next one is fetched. If the query 
+    # fails, the message is returned in the error field and the closing "]" or newline is not 
+    # written, so a cut-off export can't pass for a complete one.
+    #
+    
+    global _sqlcode, _sqlerror
+    
+    if (format not in ["ndjson","json"]):
+        errormsg("Export format must be ndjson or json.")
+        return None
+    
+    if (arrays == True):
+        local_ns["format"] = "array"
+    else:
+        local_ns["format"] = "json"
+    local_ns["compact"] = True
+    
+    if (isinstance(target, str) == True):
+        output = open(target, "w", encoding="utf-8")
+        write = output.write
+    elif (hasattr(target, "sendall") == True):
+        output = None
+        write = lambda text: target.sendall(text.encode("utf-8"))
+    else:
+        output = None
+        write = target.write
+        
+    if (format == "ndjson"):
+        start, separator, end = "", "\n", "\n"
+    else:
+        start, separator, end = "[", ",", "]"
+    
+    dumps = json.JSONEncoder(default=str).encode
+    
+    rows = 0
+    written = 0
+    error = None
+    started = time.time()
+    try:
+        first = True
+        text = start
+        for chunk in sql_iter(sqlstmts, chunksize, **local_ns):
+            if (arrays == True):
+                lines = [dumps(row) for row in chunk.rows]
+                if (first == True): lines.insert(0, dumps(chunk.columns))
+            else:
+                columns = chunk.columns
+                lines = [dumps(dict(zip(columns, row))) for row in chunk.rows]
+            if (len(lines) == 0): continue
+            if (first == False): text += separator
+            text += separator.join(lines)
+            write(text)
+            written += len(text)
+            rows += len(chunk.rows)
+            first = False
+            text = ""
+        if (_sqlcode != 0 and _sqlcode != 100):               # sql_iter ran into an error
+            error = _sqlerror
+            end = ""
+        if (first == True and format == "ndjson"): end = ""     # No rows, so an empty file
+        text += end
+        write(text)
+        written += len(text)
+    finally:
+        if (output != None): output.close()
+        
+    seconds = time.time() - started
+    
+    return {"rows": rows, "characters": written, "seconds": seconds, 
+            "rows_per_second": rows / seconds if seconds > 0 else 0, "error": error}
+
+#------------------------------
+# Page through an answer set
+#------------------------------
+
+def releasePager(worker, dsn, hdbc, hdbi):
+    
+    # Holds no reference to the Pager, so it can run when the Pager is garbage collected
+    
+    worker.shutdown(wait=False)
+    checkinConnection(dsn, hdbc, hdbi)
+
+class Pager(object):
+    
+    #
+    # Browse a query page_size rows at a time. With a key column each page continues after the 
+    # last key of the page before it (keyset paging), otherwise pages are read with OFFSET and 
+    # FETCH FIRST. Pages are read on a pooled connection by one worker thread, so the next page 
+    # is fetched in the background while the current one is being looked at, and the last few 
+    # pages viewed are kept for prev().
+    #
+    
+    def __init__(self, sql, parms, page_size, key, format, cache, prefetch, dsn):
+        
+        self.sql = sql
+        self.parms = parms
+        self.page_size = page_size
+        self.key = key
+        self.ordered = (_outerOrderBy.search(outerText(sql)) != None)
+        self.format = format
+        self.options = dict(fetchOptions(), format=format)
+        self.cache = cache
+        self.prefetch = prefetch
+        self.number = -1                            # Page currently shown
+        self.last = None                            # Last page, once we have found it
+        self._dsn = dsn
+        self._after = {0: None}                     # Key value each keyset page starts after
+        self._full = set()                          # Pages that came back with page_size rows
+        self._pages = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._worker = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._hdbc, self._hdbi = checkoutConnection(dsn)
+        
+        # A Pager that is dropped without close() still returns its connection to the pool
+        self._release = weakref.finalize(self, releasePager, self._worker, dsn, self._hdbc, self._hdbi)
+        
+    def pageSQL(self, number):
+        
+        if (self.key != None):
+            sql = "SELECT * FROM (" + self.sql + ") AS PAGE"
+            if (number > 0): sql += " WHERE " + self.key + " > ?"
+            return sql + " ORDER BY " + self.key + " FETCH FIRST " + str(self.page_size) + " ROWS ONLY"
+        else:
+            # The query may already end in ORDER BY or FETCH FIRST, so it becomes a derived table 
+            # and ORDER OF keeps its ordering
+            
+            sql = "SELECT * FROM (" + self.sql + ") AS PAGE"
+            if (self.ordered == True): sql += " ORDER BY ORDER OF PAGE"
+            return (sql + " OFFSET " + str(number * self.page_size) + " ROWS FETCH FIRST " + 
+                    str(self.page_size) + " ROWS ONLY")
+    
+    def readPage(self, number):
+        
+        # Runs on the worker thread. Returns the page and an error tuple like runStatements.
+        
+        parms = list(self.parms)
+        if (self.key != None and number > 0):
+            parms.append(self._after[number])
+            
+        try:
+            stmt = ibm_db.prepare(self._hdbc, self.pageSQL(number))
+            if (executeStmt(stmt, parms) == False):
+                return None, parseErrmsg(ibm_db.stmt_errormsg(stmt))
+            
+            columns, types = getColumns(stmt, False)
+            block = fetchBlock(stmt, self.page_size)
+            ibm_db.free_result(stmt)
+        except Exception as err:
+            return None, parseErrmsg(ibm_db.stmt_errormsg())
+        
+        with self._lock:
+            if (len(block) == 0 and number > 0):    # Past the end
+                if (number - 1 in self._full): self.last = number - 1
+                return None, None
+            if (len(block) < self.page_size):
+                self.last = number
+            else:
+                self._full.add(number)
+                if (self.key != None):
+                    keycol = [col.upper() for col in columns].index(self.key.upper())
+                    self._after[number + 1] = block[-1][keycol]
+                
+        if (self.format in ["pandas","numpy"]):
+            plan, converters = arrayPlan(types, self.options)
+        else:
+            plan, converters = None, converterPlan(types, exact=self.options["decimal"])
+        if (self.format == "json"):
+            columns = [col.lower() for col in columns]
+            
+        page = convertBlock(block, columns, plan, converters, self.format)
+        if (self.format == "array"): 
+            page.insert(0, columns)
+            
+        return page, None
+    
+    def page(self, number):
+        
+        if (number < 0 or (self.last != None and number > self.last)):
+            errormsg("No rows found", 100, "00100")
+            return None
+        
+        if (number in self._pages):
+            self._pages.move_to_end(number)
+            page = self._pages[number]
+        else:
+            future = self._pending.pop(number, None)
+            if (future == None):
+                if (self.key != None and number not in self._after):
+                    errormsg("Keyset pages can only be reached one page at a time.")
+                    return None
+                future = self._worker.submit(self.readPage, number)
+            page, error = future.result()
+            if (error != None):
+                errormsg(*error)
+                return None
+            if (page is None):
+                errormsg("No rows found", 100, "00100")
+                return None
+            self._pages[number] = page
+            while (len(self._pages) > self.cache):
+                self._pages.popitem(last=False)
+                
+        self.number = number
+        errormsg("", 0, "0")
+        
+        following = number + 1                      # Start on the next page while this one is read
+        if (self.prefetch == True and following not in self._pages and following not in self._pending):
+            if (self.last == None and (self.key == None or following in self._after)):
+                self._pending[following] = self._worker.submit(self.readPage, following)
+                
+        return page
+    
+    def next(self):
+        return self.page(self.number + 1)
+    
+    def prev(self):
+        return self.page(self.number - 1)
+    
+    def first(self):
+        return self.page(0)
+    
+    def current(self):
+        return self.page(self.number)
+    
+    def __iter__(self):
+        page = self.first()
+        while (page is not None):
+            yield page
+            page = self.next()
+            
+    def close(self):
+        
+        self._worker.shutdown(wait=True)
+        self._pages.clear()
+        self._pending.clear()
+        self._release()                             # Only the first call does anything
+        self._hdbc = None
+            
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        self.close()
+
+def sql_page(sqlstmt, page_size=20, key=None, cache=3, prefetch=True, **local_ns):
+    
+    #
+    # Return a Pager over the query. Call next(), prev() or page(n) to get a page in the current 
+    # format. Declare key (an ascending, unique column) to page on the key instead of OFFSET.
+    #
+    
+    global _settings, _connected, _dsn
+    
+    _asyncError.set(None)
+    
+    setOptions(local_ns)
+    
+    if (_connected == False):
+        if (db2_doConnect() == False):
+            errormsg('A CONNECT statement must be issued before issuing SQL statements.')
+            return None
+        
+    sqlstmt = stripComments(sqlstmt.strip()).replace("\n"," ")
+    sqlLines = splitSQL(sqlstmt, _settings["delim"])
+    if (len(sqlLines) == 0):
+        return None
+    
+    parms = None
+    if (_settings["bind"] == True): parms = []
+    
+    sqlType, sql = sqlParser(sqlLines[0], local_ns, parms)
+    if (sqlType not in _readOnlyCommands):
+        errormsg("sql_page() only pages through queries.")
+        return None
+    
+    try:
+        return Pager(sql, parms or [], int(page_size), key, _settings["format"], max(cache, 1), prefetch, _dsn)
+    except Exception as err:
+        errormsg(*parseErrmsg(ibm_db.conn_errormsg()))
+        return None
+
+#------------------------------
+# Run a SQL script file
+#------------------------------
+
+def run_script(path, commitcount=100, checkpoint=None, restart=False, delimiter=None):
+    
+    #
+    # Run the statements in a SQL file without reading the whole file into memory. Statements are 
+    # grouped into transactions of commitcount statements and after every COMMIT the byte offset 
+    # reached is written to the checkpoint file (path + ".checkpoint" by default). If a statement 
+    # fails the open transaction is rolled back and the next run starts again from the checkpoint,
+    # unless restart=True. The checkpoint is removed once the whole file has run.
+    #
+    
+    global _hdbc, _connected, _settings
+    
+    _asyncError.set(None)
+    
+    if (_connected == False):
+        if (db2_doConnect() == False):
+            errormsg('A CONNECT statement must be issued before issuing SQL statements.')
+            return None
+        
+    if (delimiter == None): delimiter = _settings["delim"]
+    if (checkpoint == None): checkpoint = path + ".checkpoint"
+    
+    offset = 0
+    done = 0
+    if (restart == False and os.path.exists(checkpoint) == True):
+        try:
+            with open(checkpoint, "r") as saved:
+                state = json.load(saved)
+            offset = state["offset"]
+            done = state["statements"]
+        except Exception as err:
+            errormsg("Checkpoint file " + checkpoint + " could not be read.")
+            return None
+        
+    autocommit = ibm_db.autocommit(_hdbc)
+    ibm_db.autocommit(_hdbc, False)
+    
+    count = 0
+    pending = 0
+    committed = offset
+    error = None
+    start = time.time()
+    
+    try:
+        with open(path, "rb") as script:
+            script.seek(offset)
+            for sql, end in scriptStatements(script, offset, delimiter):
+                try:
+                    keyword = sql.split(None,1)[0].upper()
+                    if (keyword not in _readOnlyCommands): invalidateResults(sql)
+                    if (keyword in _ddlCommands):           # Same as prepareStmt does for DDL
+                        clearStmtCache()
+                        _procCache.clear()
+                    stmt = ibm_db.exec_immediate(_hdbc, sql)
+                    if (stmt == False): raise Exception(sql)
+                except Exception as err:
+                    db2_error()
+                    error = _sqlerror
+                    break
+                
+                count += 1
+                pending += 1
+                if (pending >= commitcount):
+                    ibm_db.commit(_hdbc)
+                    saveCheckpoint(checkpoint, path, end, done + count)
+                    committed = end
+                    pending = 0
+                    
+                offset = end
+                
+        if (error == None):
+            ibm_db.commit(_hdbc)
+            committed = offset
+            if (os.path.exists(checkpoint) == True): os.remove(checkpoint)
+        else:
+            ibm_db.rollback(_hdbc)                              # Back to the last checkpoint
+            count = count - pending
+            
+    finally:
+        ibm_db.autocommit(_hdbc, autocommit)
+        
+    elapsed = time.time() - start
+    if (elapsed > 0):
+        rate = count / elapsed
+    else:
+        rate = float(count)
+        
+    return {"statements" : count, "total" : done + count, "seconds" : elapsed, 
+            "statements_per_second" : rate, "offset" : committed, "error" : error}
+
+def scriptStatements(script, offset, delimiter):
+    
+    #
+    # Yield (statement, end offset) for each statement in the open binary file. Only the text of
+    # the statement being collected is held, and quotes and comments are respected because 
+    # every line goes through the same tokenizer as splitSQL.
+    #
+    
+    scanner = sqlScanner(delimiter)
+    carry = ""
+    tokens = []
+    
+    for raw in script:
+        line = raw.decode("utf-8")
+        text = carry + line
+        lineStart = offset
+        offset += len(raw)
+        
+        tokens = []
+        last = 0
+        for found in scanner.finditer(text):
+            if (found.lastgroup == "delim"):
+                sql = "".join([value for kind, value in tokens if kind != "comment"]).strip()
+                end = found.end() - len(carry)
+                if (end > 0):
+                    end = lineStart + len(line[:end].encode("utf-8"))
+                else:
+                    end = lineStart
+                if (sql != ""): yield sql, end
+                tokens = []
+                last = found.end()
+            else:
+                tokens.append((found.lastgroup, found.group()))
+                
+        carry = text[last:]
+        
+    sql = "".join([value for kind, value in tokens if kind != "comment"]).strip()
+    if (sql != ""): yield sql, offset
+
+def saveCheckpoint(checkpoint, path, offset, statements):
+    
+    # Written to a temporary file and renamed so a crash never leaves half a checkpoint
+    
+    work = checkpoint + ".tmp"
+    with open(work, "w") as saved:
+        json.dump({"path" : path, "offset" : offset, "statements" : statements, "time" : time.time()}, saved)
+    os.replace(work, checkpoint)
+
+#------------------------------
+# Bulk Execute
+#------------------------------
+
+def sql_many(sqlstmt, rows, batchsize=1000, commitcount=None):
+    
+    #
+    # Run one statement with ? markers (typically an INSERT) over many rows, sending batchsize
+    # rows per round trip with ibm_db.execute_many. With commitcount set, autocommit is turned 
+    # off for the load and a COMMIT is issued every commitcount rows. If a batch fails, the rows
+    # since the last COMMIT are rolled back and the message is returned in the error field.
+    #
+    
+    global _hdbc, _connected
+    
+    _asyncError.set(None)
+    
+    if (_connected == False):
+        if (db2_doConnect() == False):
+            errormsg('A CONNECT statement must be issued before issuing SQL statements.')
+            return None
+        
+    invalidateResults(sqlstmt)                            # The rows loaded make cached answers stale
+        
+    try:
+        stmt = prepareStmt(_hdbc, sqlstmt)
+        if (stmt == False):
+            db2_error()
+            return None
+    except Exception as err:
+        db2_error()
+        return None
+        
+    if (commitcount != None):
+        autocommit = ibm_db.autocommit(_hdbc)
+        ibm_db.autocommit(_hdbc, False)
+        
+    rowcount = 0
+    uncommitted = 0
+    error = None
+    start = time.time()
+    
+    try:
+        try:
+            for batch in bulkBatches(rows, batchsize):
+                result = ibm_db.execute_many(stmt, batch)
+                if (result == None or result == False):
+                    raise Exception(sqlstmt)
+                rowcount += len(batch)
+                uncommitted += len(batch)
+                if (commitcount != None and uncommitted >= commitcount):
+                    ibm_db.commit(_hdbc)
+                    uncommitted = 0
+        except Exception as err:
+            db2_error()
+            error = _sqlerror
+                
+        if (commitcount != None):
+            if (error == None):
+                ibm_db.commit(_hdbc)
+            else:
+                ibm_db.rollback(_hdbc)                          # Back to the last commit
+                rowcount = rowcount - uncommitted
+                
+    finally:
+        if (commitcount != None):
+            ibm_db.autocommit(_hdbc, autocommit)
+            
+    elapsed = time.time() - start
+    if (elapsed > 0):
+        rate = rowcount / elapsed
+    else:
+        rate = float(rowcount)
+    
+    return {"rows" : rowcount, "seconds" : elapsed, "rows_per_second" : rate, "error" : error}
+
+#------------------------------
+# Split rows into batches
+#------------------------------
+
+def bulkBatches(rows, batchsize):
+    
+    # DataFrames are converted one slice at a time so NaN becomes NULL and NumPy scalars
+    # become Python values without copying the whole frame
+    
+    if (_settings["pandas"] == True and isinstance(rows, pandas.DataFrame) == True):
+        for start in range(0, len(rows), batchsize):
+            piece = rows.iloc[start:start+batchsize].astype(object)
+            piece = piece.where(piece.notna(), None)
+            yield tuple(piece.itertuples(index=False, name=None))
+    else:
+        rows = iter(rows)
+        batch = tuple(tuple(row) for row in itertools.islice(rows, batchsize))
+        while (batch):
+            yield batch
+            batch = tuple(tuple(row) for row in itertools.islice(rows, batchsize))
+
+#------------------------------
+# Load a DataFrame into a table
+#------------------------------
+
+def load_dataframe(df, table, batchsize=1000, commitcount=None):
+    
+    columns = ",".join(['"' + str(col).upper() + '"' for col in df.columns])
+    markers = ",".join(["?"] * len(df.columns))
+    
+    insert = "INSERT INTO " + table + " (" + columns + ") VALUES (" + markers + ")"
+    
+    return sql_many(insert, df, batchsize, commitcount)
 
 #------------------------------
 # Startup Script
@@ -1350,12 +3380,37 @@ warnings.filterwarnings("ignore")
 _connected = False
 _hdbc = None
 _hdbi = None
-_stmt = []
-_stmtID = []
+_dsn = None
+_connections = {}
+_pool = {}
+_poolLock = threading.RLock()                   # A Pager finalizer may check in during a collection
+_stmt = {}
+_stmtID = {}
 _stmtSQL = []
+_stmtCache = OrderedDict()
+_stmtStats = {"hits" : 0, "misses" : 0}
+_stmtBusy = set()
+_columnCache = {}
+_procCache = {}
+_callTokens = re.compile(r""""(?P<double>[^"]*)"?|'(?P<single>[^']*)'?|\[(?P<bracket>[^\]]*)\]?"""
+                         r"""|(?P<comma>,)|(?P<close>\))|(?P<text>[^"'\[,)]+)""")
+_readOnlyCommands = ["SELECT","WITH","VALUES"]
+_ddlCommands = ["CREATE","DROP","ALTER","RENAME","COMMENT","GRANT","REVOKE","TRUNCATE"]
 _vars = {}
+_resultCache = OrderedDict()
+_resultStats = {"hits" : 0, "misses" : 0, "evictions" : 0, "invalidations" : 0}
+_resultBytes = 0
+_changedTables = {}
+_changedTable = re.compile(r"""\s*(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM|MERGE\s+INTO|TRUNCATE(?:\s+TABLE)?|"""
+                           r"""(?:CREATE|DROP|ALTER|RENAME)(?:\s+OR\s+REPLACE)?(?:\s+\w+)*?\s+(?:TABLE|VIEW|NICKNAME|ALIAS))"""
+                           r"""\s+((?:"[^"]+"|[\w$#@]+)(?:\s*\.\s*(?:"[^"]+"|[\w$#@]+))?)""", re.I)
+_outerOrderBy = re.compile(r"\bORDER\s+BY\b", re.I)
+_timings = deque(maxlen=1000)
+_timingHooks = []
 
 # Db2 Error Messages and Codes
 _sqlcode = 0
 _sqlstate = "0"
 _sqlerror = ""
+_asyncError = contextvars.ContextVar("_asyncError", default=None)
+_asyncLimit = weakref.WeakKeyDictionary()
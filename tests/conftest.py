@@ -0,0 +1,27 @@
+#
+# The db2.py tests run against the fake ibm_db driver in this directory, so they need no database
+#
+
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)                    # The fake ibm_db comes before any installed driver
+
+import ibm_db
+import db2
+
+@pytest.fixture
+def db():
+
+    if (db2._connected == False):
+        db2.sql("CONNECT TO SAMPLE USER DB2INST1 USING password HOST localhost PORT 50000")
+    ibm_db.reset()
+    db2.clearStmtCache()
+    db2.clearResultCache()
+    db2._stmtStats.update({"hits" : 0, "misses" : 0})
+    db2._stmtBusy.clear()
+    return db2
@@ -0,0 +1,125 @@
+#
+# Stand-in for the ibm_db driver so db2.py can run without a database. Answers come from 
+# RESULTS, keyed by the start of the SQL text, and every driver call is counted in counts.
+#
+
+SQL_INTEGER = 4
+SQL_DOUBLE = 8
+SQL_CHAR = 1
+SQL_BINARY = -2
+SQL_PARAM_INPUT = 1
+
+RESULTS = {}                                # SQL prefix -> (column names, column types, rows)
+FAILURES = set()                            # SQL prefixes whose execute fails
+counts = {}
+error = "[IBM][CLI Driver][DB2/LINUXX8664] SQL0204N  undefined name.  SQLSTATE=42704 SQLCODE=-204"
+
+def reset():
+    RESULTS.clear()
+    FAILURES.clear()
+    counts.clear()
+
+def count(name):
+    counts[name] = counts.get(name, 0) + 1
+
+def matches(sql, prefixes):
+    text = " ".join(sql.split()).upper()
+    return [prefix for prefix in prefixes if text.startswith(" ".join(prefix.split()).upper())]
+
+class Connection(object):
+    def __init__(self, dsn):
+        self.dsn = dsn
+        self.open = True
+        self.auto = True
+
+class Statement(object):
+    def __init__(self, hdbc, sql):
+        self.hdbc = hdbc
+        self.sql = sql
+        self.result = None
+        self.position = 0
+        self.params = {}
+        self.rows = []
+        found = matches(sql, RESULTS)
+        if (len(found) > 0): self.result = RESULTS[max(found, key=len)]
+
+def connect(dsn, user, password):
+    count("connect")
+    return Connection(dsn)
+
+def active(hdbc):
+    return hdbc.open
+
+def close(hdbc):
+    count("close")
+    hdbc.open = False
+    return True
+
+def autocommit(hdbc, value=None):
+    if (value == None): return 1 if hdbc.auto else 0
+    hdbc.auto = bool(value)
+    return True
+
+def commit(hdbc):
+    count("commit")
+    return True
+
+def rollback(hdbc):
+    count("rollback")
+    return True
+
+def prepare(hdbc, sql, options=None):
+    count("prepare")
+    return Statement(hdbc, sql)
+
+def execute(stmt, params=None):
+    count("execute")
+    stmt.position = 0
+    return len(matches(stmt.sql, FAILURES)) == 0
+
+def exec_immediate(hdbc, sql):
+    stmt = prepare(hdbc, sql)
+    return stmt if execute(stmt) else False
+
+def execute_many(stmt, rows):
+    count("execute_many")
+    if (len(matches(stmt.sql, FAILURES)) > 0): return False
+    stmt.rows.extend(rows)
+    return len(rows)
+
+def bind_param(stmt, number, value, *args):
+    stmt.params[number] = value
+    return True
+
+def num_fields(stmt):
+    return len(stmt.result[0]) if stmt.result else 0
+
+def num_rows(stmt):
+    return 1
+
+def field_name(stmt, column):
+    return stmt.result[0][column] if stmt.result and column < len(stmt.result[0]) else False
+
+def field_type(stmt, column):
+    return stmt.result[1][column] if stmt.result and column < len(stmt.result[1]) else False
+
+def fetch_tuple(stmt):
+    count("fetch_tuple")
+    if (stmt.result == None or stmt.position >= len(stmt.result[2])): return False
+    stmt.position += 1
+    return stmt.result[2][stmt.position - 1]
+
+def free_result(stmt):
+    return True
+
+def stmt_errormsg(stmt=None):
+    return error
+
+def conn_errormsg(hdbc=None):
+    return error
+
+def procedures(hdbc, qualifier, schema, name):
+    return False
+
+def callproc(hdbc, name, args=None):
+    return False
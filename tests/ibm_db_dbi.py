@@ -0,0 +1,10 @@
+#
+# Stand-in for ibm_db_dbi, see ibm_db.py
+#
+
+class Connection(object):
+    def __init__(self, hdbc):
+        self.hdbc = hdbc
+
+    def close(self):
+        pass
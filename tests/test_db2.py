@@ -0,0 +1,76 @@
+#
+# db2.py against the counting fake driver
+#
+
+import gc
+
+import pytest
+
+import ibm_db
+
+STOCKS = (["SYMBOL", "PRICE", "VOLUME"], ["string", "double", "int"],
+          [("IBM", 140.5, 100), ("AAPL", 170.25, 200), ("MSFT", 310.0, 300)])
+
+@pytest.mark.parametrize("format", ["pandas", "numpy", "array", "json"])
+def test_one_prepare_and_execute_per_query(db, format):
+
+    ibm_db.RESULTS["SELECT * FROM STOCKS"] = STOCKS
+    result = db.sql("SELECT * FROM STOCKS", format=format)
+
+    assert ibm_db.counts["prepare"] == 1
+    assert ibm_db.counts["execute"] == 1
+    assert result is not None
+
+def test_columnar_fetch_types(db):
+
+    ibm_db.RESULTS["SELECT * FROM STOCKS"] = STOCKS
+    result = db.sql("SELECT * FROM STOCKS", format="numpy")
+
+    assert str(result["VOLUME"].dtype) == "int64"
+    assert str(result["PRICE"].dtype) == "float64"
+    assert list(result["SYMBOL"]) == ["IBM", "AAPL", "MSFT"]
+
+def test_statement_cache_hit(db):
+
+    ibm_db.RESULTS["SELECT * FROM STOCKS"] = STOCKS
+    for _ in range(3):
+        db.sql("SELECT * FROM   STOCKS", format="array")
+
+    assert ibm_db.counts["prepare"] == 1
+    assert ibm_db.counts["execute"] == 3
+    assert db.stmtCacheStats()["hits"] == 2
+    assert db.stmtCacheStats()["misses"] == 1
+
+def test_statement_cache_cleared_by_commit(db):
+
+    ibm_db.RESULTS["SELECT * FROM STOCKS"] = STOCKS
+    db.sql("SELECT * FROM STOCKS", format="array")
+    db.sql("COMMIT")
+    db.sql("SELECT * FROM STOCKS", format="array")
+
+    assert ibm_db.counts["prepare"] == 2
+
+def test_bound_variables_reuse_one_statement(db):
+
+    ibm_db.RESULTS["SELECT * FROM STOCKS WHERE SYMBOL = ?"] = STOCKS
+    for symbol in ["IBM", "AAPL", "MSFT", "IBM"]:
+        db.sql("SELECT * FROM STOCKS WHERE SYMBOL = :symbol", format="array", bind=True, symbol=symbol)
+
+    assert ibm_db.counts["prepare"] == 1
+    assert db.stmtCacheStats()["hits"] == 3
+
+def test_streaming_handle_not_reused(db):
+
+    ibm_db.RESULTS["SELECT * FROM STOCKS"] = STOCKS
+    chunks = db.sql_iter("SELECT * FROM STOCKS", 1, format="array")
+    first = next(chunks)
+    db.sql("SELECT * FROM STOCKS", format="array")        # Needs a handle of its own
+    rest = list(chunks)
+
+    assert ibm_db.counts["prepare"] == 2
+    assert [first] + rest == [[list(row)] for row in STOCKS[2]]
+
+    del chunks
+    gc.collect()
+    db.sql("SELECT * FROM STOCKS", format="array")        # The cached handle is free again
+    assert ibm_db.counts["prepare"] == 2
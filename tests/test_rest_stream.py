@@ -0,0 +1,87 @@
+#
+# Db2REST response streaming against a local HTTP server. The class lives in a notebook, so the
+# code cell is run into a namespace first.
+#
+
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+NOTEBOOK = os.path.join(os.path.dirname(__file__), "..", "RESTfulEndpointService Class402.ipynb")
+
+def loadCell(path, index):
+
+    with open(path, encoding="utf-8") as notebook:
+        source = "".join(json.load(notebook)["cells"][index]["source"])
+    namespace = {}
+    exec("\n".join(line for line in source.splitlines() if line.strip().startswith("%") == False), namespace)
+    return namespace
+
+class Handler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    chunked = False
+
+    def setup(self):
+        Handler.connections += 1
+        super().setup()
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+        rows = [{"ID": i, "NAME": "n%d" % i} for i in range(50)]
+        body = json.dumps({"jobStatus": 4, "resultSet": rows}).encode()
+        if (request.get("parameters", {}).get("truncate") == True):
+            body = body[:len(body) // 2]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        if (Handler.chunked == True):
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for start in range(0, len(body), 256):
+                piece = body[start:start+256]
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(piece), piece))
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+@pytest.fixture
+def service():
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    Handler.connections = 0
+    yield "http://127.0.0.1:%d" % server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+@pytest.mark.parametrize("chunked", [False, True])
+def test_connection_reused(service, chunked):
+
+    Handler.chunked = chunked
+    db = loadCell(NOTEBOOK, 0)["Db2REST"](service, poolsize=1)
+    for _ in range(20):
+        frame = db.runStatement("SELECT * FROM T")
+        assert frame.shape == (50, 2)
+    db.close()
+
+    assert Handler.connections == 1
+
+def test_service_many_reports_bad_responses_per_item(service):
+
+    Handler.chunked = False
+    db = loadCell(NOTEBOOK, 0)["Db2REST"](service)
+    rows, failures = db.callService_many("S", "1.0", [{"truncate": False}, {"truncate": True}, {"truncate": False}])
+    db.close()
+
+    assert len(rows) == 100
+    assert list(failures["item"]) == [1]